@@ -1,19 +1,56 @@
+import hashlib
 import os
-from openpyxl import Workbook
+import shutil
+import tempfile
+import threading
+import zipfile
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-from datetime import date
+from datetime import date, datetime
 from config_manager import load_path, load_password
+from xlsx_patch import patch_sheet_rows, sheet_rows_match
 
+TIME_FORMAT = "%I:%M:%S %p"
+DATA_ROWS = 200  # pre-formatted rows below the headers
+SHEET_HEADERS = ["STAFF NAME", "Clock In", "Clock Out", "Remarks", "All Taps"]
 
-def generate_staff_sign_in_form(target_date: date):
-    """
-    Generates a new XLSX file for a specific date in the configured directory.
-    """
+# The blank form is rendered once per configuration into this folder and then
+# copied for each day. Bump TEMPLATE_VERSION whenever _build_form changes.
+TEMPLATE_DIR = 'sheet_templates'
+TEMPLATE_VERSION = 2
+DATE_PLACEHOLDER = '{{SHEET_DATE}}'
+
+# Sheets written from the database carry this in their document keywords.
+# Sheets without it were written before the database became the record (or
+# by hand) and may hold rows the database does not, so they are never
+# overwritten blindly; a copy is kept in LEGACY_DIR before they are replaced.
+EXPORT_MARKER = 'StaffSignIn database export'
+LEGACY_DIR = 'legacy_sheets'
+_template_lock = threading.Lock()
+
+
+def sheet_date_from_path(file_path):
+    """Returns the date encoded in a daily sheet's file name ('M-D-YYYY.xlsx')."""
+    date_part = os.path.splitext(os.path.basename(file_path))[0]
+    return datetime.strptime(date_part, '%m-%d-%Y').date()
+
+
+def sheet_file_path(target_date: date):
+    """Returns the path of the daily sheet for a date in the configured directory."""
+    # Built by hand: the unpadded strftime flags differ between Windows and other platforms.
+    return os.path.join(load_path(), f"{target_date.month}-{target_date.day}-{target_date.year}.xlsx")
+
+
+def _sheet_date_text(target_date: date):
+    return f"{target_date.month}/{target_date.day}/{target_date.year}"
+
+
+def _build_form(date_str):
+    """Builds the empty, protected sign-in form showing `date_str`. Returns the workbook."""
     workbook_password = load_password()
-    save_dir = load_path()
-    os.makedirs(save_dir, exist_ok=True)
 
     wb = Workbook()
+    wb.properties.keywords = EXPORT_MARKER
     ws = wb.active
     ws.title = "Staff Sign In"
 
@@ -32,7 +69,6 @@ def generate_staff_sign_in_form(target_date: date):
     ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
     ws['A1'].border = thin_border
 
-    date_str = target_date.strftime("%#m/%#d/%Y")
     ws.merge_cells('E1:E1')
     ws['E1'] = date_str
     ws['E1'].font = white_bold_font_row1
@@ -42,8 +78,7 @@ def generate_staff_sign_in_form(target_date: date):
     ws.row_dimensions[1].height = 35
 
     # --- Row 2: Column Headers ---
-    headers = ["STAFF NAME", "Clock In", "Clock Out", "Remarks", "All Taps"]
-    for col_idx, header_text in enumerate(headers, 1):
+    for col_idx, header_text in enumerate(SHEET_HEADERS, 1):
         cell = ws.cell(row=2, column=col_idx, value=header_text)
         cell.font = black_bold_font_row2
         cell.border = thin_border
@@ -52,7 +87,7 @@ def generate_staff_sign_in_form(target_date: date):
     ws.row_dimensions[2].height = 25
 
     # --- Apply Borders and Alignment to data rows ---
-    for row_idx in range(3, 203):
+    for row_idx in range(3, 3 + DATA_ROWS):
         for col_idx in range(1, 6):  # Columns A, B, C, D, E
             cell = ws.cell(row=row_idx, column=col_idx)
             cell.border = thin_border
@@ -77,14 +112,159 @@ def generate_staff_sign_in_form(target_date: date):
 
     ws.protection.sheet = True
     ws.protection.password = workbook_password
+    return wb
+
+
+def template_path():
+    """Returns the cached blank form for the current configuration, rendering it if needed."""
+    key = hashlib.sha256(f"{TEMPLATE_VERSION}|{DATA_ROWS}|{load_password()}".encode()).hexdigest()[:16]
+    path = os.path.join(TEMPLATE_DIR, f"sign_in_form_{key}.xlsx")
+    if os.path.exists(path):
+        return path
+    # Exports for different days run in parallel; only one of them renders the
+    # form, and each render goes to its own temp file so a half-written
+    # template is never renamed into place (other processes may render too).
+    with _template_lock:
+        if not os.path.exists(path):
+            os.makedirs(TEMPLATE_DIR, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix='.xlsx', dir=TEMPLATE_DIR)
+            os.close(fd)
+            try:
+                _build_form(DATE_PLACEHOLDER).save(temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+    return path
+
+
+def is_exported_sheet(file_path):
+    """True if a sheet was written by write_daily_sheet, i.e. it carries EXPORT_MARKER."""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            return EXPORT_MARKER.encode() in archive.read('docProps/core.xml')
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+
 
-    date_for_filename = target_date.strftime("%#m-%#d-%Y")
-    file_path = os.path.join(save_dir, f"{date_for_filename}.xlsx")
+def _backup_legacy_sheet(file_path):
+    """Copies a sheet into LEGACY_DIR beside it, never over an earlier copy. Returns the copy's path."""
+    folder = os.path.join(os.path.dirname(file_path), LEGACY_DIR)
+    os.makedirs(folder, exist_ok=True)
+    base, ext = os.path.splitext(os.path.basename(file_path))
+    backup_path = os.path.join(folder, base + ext)
+    copies = 1
+    while os.path.exists(backup_path):
+        copies += 1
+        backup_path = os.path.join(folder, f"{base} ({copies}){ext}")
+    shutil.copy2(file_path, backup_path)
+    return backup_path
+
+
+def _copy_template(target_date: date, dest_path):
+    """Copies the cached blank form to `dest_path`, patching the date into the sheet XML."""
+    date_bytes = _sheet_date_text(target_date).encode()
+    with zipfile.ZipFile(template_path()) as src, \
+            zipfile.ZipFile(dest_path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info)
+            if info.filename.startswith('xl/worksheets/') or info.filename == 'xl/sharedStrings.xml':
+                data = data.replace(DATE_PLACEHOLDER.encode(), date_bytes)
+            dst.writestr(info, data)
+
+
+def read_daily_sheet(file_path):
+    """
+    Streams a daily sheet for display. Returns (date_str, headers, rows), where
+    rows are tuples of cell values up to the last populated row. Sheets are
+    written top-down without gaps, so reading stops at the first blank row
+    instead of parsing the pre-formatted rows after it.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows_iter = ws.iter_rows(values_only=True)
+        title_row = next(rows_iter, ())
+        headers = [value for value in next(rows_iter, ()) if value is not None]
+        # The date is the first date-like text in the title row (E1 on current sheets).
+        date_str = next((value for value in title_row if isinstance(value, str) and '/' in value), None)
+        if date_str is None and len(title_row) >= 3:
+            date_str = title_row[3] if len(title_row) >= 4 else title_row[2]
+
+        rows = []
+        for values in rows_iter:
+            values = tuple(values[:len(headers)])
+            if all(value is None for value in values):
+                break
+            rows.append(values)
+        return date_str, headers, rows
+    finally:
+        wb.close()
+
+
+def _sheet_values(row):
+    """Returns the A-E cell values for one database row (see database_manager.get_day_sheet)."""
+    return (
+        row['name'],
+        row['clock_in'].strftime(TIME_FORMAT),
+        row['clock_out'].strftime(TIME_FORMAT) if row['clock_out'] else None,
+        row['remarks'] or None,
+        ", ".join(tap.strftime(TIME_FORMAT) for tap in row['taps']),
+    )
+
+
+def sheet_view(target_date: date, rows):
+    """Returns database rows in read_daily_sheet's (date_str, headers, rows) form, without touching the file."""
+    return _sheet_date_text(target_date), list(SHEET_HEADERS), [_sheet_values(row) for row in rows]
+
+
+def write_daily_sheet(target_date: date, rows, patch=True):
+    """
+    Renders a day's sheet from database rows (see database_manager.get_day_sheet)
+    and saves it over the day's file. An existing sheet is patched in place,
+    rewriting only the rows that changed; otherwise (or with patch=False) a
+    fresh copy of the template is filled in. The new file is written to a
+    temporary file first, so a failed save never leaves a truncated sheet behind.
+    A sheet this function did not write is only replaced when its rows already
+    match the database, or after it has been copied to LEGACY_DIR; one with
+    rows is never replaced by an empty sheet.
+    Returns the file path, or None if the file could not be written.
+    """
+    os.makedirs(load_path(), exist_ok=True)
+    file_path = sheet_file_path(target_date)
+    values = [_sheet_values(row) for row in rows]
+    if os.path.exists(file_path) and not is_exported_sheet(file_path):
+        if not sheet_rows_match(file_path, values):
+            if not values:
+                print(f"Kept '{file_path}': it has rows the database does not.")
+                return file_path
+            try:
+                backup_path = _backup_legacy_sheet(file_path)
+            except OSError as e:
+                print(f"Error backing up '{file_path}': {e}")
+                return None
+            print(f"Copied '{file_path}' to '{backup_path}' before rewriting it from the database.")
+        patch = False  # render from the template, so the new file carries EXPORT_MARKER
+    if patch and os.path.exists(file_path) and patch_sheet_rows(file_path, values):
+        return file_path
 
+    temp_path = file_path + ".tmp"
     try:
-        wb.save(file_path)
-        print(f"Successfully generated '{file_path}'.")
+        _copy_template(target_date, temp_path)
+        if not patch_sheet_rows(temp_path, values):
+            # More rows than the form holds: let openpyxl extend it.
+            wb = load_workbook(template_path())
+            ws = wb.active
+            ws['E1'] = _sheet_date_text(target_date)
+            for row_idx, row_values in enumerate(values, 3):
+                for col_idx, value in enumerate(row_values, 1):
+                    if value is not None:
+                        ws.cell(row=row_idx, column=col_idx, value=value)
+            wb.save(temp_path)
+        os.replace(temp_path, file_path)
         return file_path
     except Exception as e:
-        print(f"An error occurred while saving the file: {e}")
-        return None
\ No newline at end of file
+        print(f"An error occurred while saving '{file_path}': {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
@@ -4,7 +4,7 @@ from PySide6.QtWidgets import (
     QDialogButtonBox
 )
 
-from database_manager import get_all_staff
+from staff_directory import get_staff_directory
 
 class AddUserDialog(QDialog):
     """A dialog to search for and select a staff member from the database."""
@@ -37,9 +37,9 @@ class AddUserDialog(QDialog):
         self.populate_staff_list()
 
     def populate_staff_list(self):
-        """Fetches all staff from the database and adds them to the list."""
+        """Adds every staff member from the shared roster to the list."""
         self.staff_list_widget.clear()
-        all_staff = get_all_staff()
+        all_staff = get_staff_directory().all()
         for staff_member in all_staff:
             item = QListWidgetItem(staff_member['name'])
             # Store the full staff data (token and name) in the item
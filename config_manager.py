@@ -10,6 +10,22 @@ LOGO_PATH_KEY = 'LogoPath'
 ADMIN_MODE_KEY = 'AdminMode'
 NAV_SLIDER_KEY = 'NavigationSlider'
 THEME_KEY = 'Theme'
+DB_PROFILE_KEY = 'DatabaseProfile'
+PARTITIONED_STORAGE_KEY = 'PartitionedStorage'
+QUERY_LOGGING_KEY = 'QueryLogging'
+SLOW_QUERY_MS_KEY = 'SlowQueryMs'
+EXPLAIN_SLOW_QUERIES_KEY = 'ExplainSlowQueries'
+GROUP_COMMIT_MS_KEY = 'GroupCommitMs'
+GROUP_COMMIT_MAX_BATCH_KEY = 'GroupCommitMaxBatch'
+BACKUP_DIRECTORY_KEY = 'BackupDirectory'
+BACKUP_RETENTION_KEY = 'BackupRetention'
+BACKUP_INTERVAL_HOURS_KEY = 'BackupIntervalHours'
+MAINTENANCE_INTERVAL_HOURS_KEY = 'MaintenanceIntervalHours'
+MAINTENANCE_IDLE_SECONDS_KEY = 'MaintenanceIdleSeconds'
+EXCEL_WRITE_DELAY_MS_KEY = 'ExcelWriteDelayMs'
+EXCEL_WRITE_MAX_EVENTS_KEY = 'ExcelWriteMaxEvents'
+EXPORT_RETRY_SECONDS_KEY = 'ExportRetrySeconds'
+EXPORT_RETRY_MAX_SECONDS_KEY = 'ExportRetryMaxSeconds'
 
 
 def get_default_save_directory():
@@ -90,3 +106,131 @@ def load_theme():
         config.read(CONFIG_FILE)
         return config.get(DEFAULT_SECTION, THEME_KEY, fallback='light')
     return 'light'
+
+def load_db_profile():
+    """Loads the database pragma profile ('durable', 'balanced' or 'fast'), or returns 'balanced'."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.get(DEFAULT_SECTION, DB_PROFILE_KEY, fallback='balanced')
+    return 'balanced'
+
+def load_partitioned_storage():
+    """Loads whether closed years are moved into per-year database files, or returns False."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getboolean(DEFAULT_SECTION, PARTITIONED_STORAGE_KEY, fallback=False)
+    return False
+
+def load_query_logging():
+    """Loads whether database statements are timed and logged, or returns False."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getboolean(DEFAULT_SECTION, QUERY_LOGGING_KEY, fallback=False)
+    return False
+
+def load_slow_query_ms():
+    """Loads the slow-query threshold in milliseconds, or returns 50."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, SLOW_QUERY_MS_KEY, fallback=50.0)
+    return 50.0
+
+def load_explain_slow_queries():
+    """Loads whether EXPLAIN QUERY PLAN is captured for slow queries, or returns False."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getboolean(DEFAULT_SECTION, EXPLAIN_SLOW_QUERIES_KEY, fallback=False)
+    return False
+
+def load_group_commit_ms():
+    """Loads how long tap writes are collected before a group commit, in milliseconds, or returns 5."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, GROUP_COMMIT_MS_KEY, fallback=5.0)
+    return 5.0
+
+def load_group_commit_max_batch():
+    """Loads the most tap writes committed together, or returns 100."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getint(DEFAULT_SECTION, GROUP_COMMIT_MAX_BATCH_KEY, fallback=100)
+    return 100
+
+def load_backup_directory():
+    """Loads the folder database backups are written to, or returns 'backups'."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.get(DEFAULT_SECTION, BACKUP_DIRECTORY_KEY, fallback='backups')
+    return 'backups'
+
+def load_backup_retention():
+    """Loads how many database backups are kept, or returns 14."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getint(DEFAULT_SECTION, BACKUP_RETENTION_KEY, fallback=14)
+    return 14
+
+def load_backup_interval_hours():
+    """Loads the hours between automatic database backups (0 disables them), or returns 24."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, BACKUP_INTERVAL_HOURS_KEY, fallback=24.0)
+    return 24.0
+
+def load_maintenance_interval_hours():
+    """Loads the hours between database maintenance passes (0 disables them), or returns 24."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, MAINTENANCE_INTERVAL_HOURS_KEY, fallback=24.0)
+    return 24.0
+
+def load_maintenance_idle_seconds():
+    """Loads how long the app must be idle before maintenance runs, or returns 120."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, MAINTENANCE_IDLE_SECONDS_KEY, fallback=120.0)
+    return 120.0
+
+def load_excel_write_delay_ms():
+    """Loads how long sheet updates are coalesced before the xlsx is saved, in milliseconds, or returns 2000."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, EXCEL_WRITE_DELAY_MS_KEY, fallback=2000.0)
+    return 2000.0
+
+def load_excel_write_max_events():
+    """Loads how many sheet updates force an early xlsx save, or returns 20."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getint(DEFAULT_SECTION, EXCEL_WRITE_MAX_EVENTS_KEY, fallback=20)
+    return 20
+
+def load_export_retry_seconds():
+    """Loads the first retry delay for a sheet that could not be saved, in seconds, or returns 5."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, EXPORT_RETRY_SECONDS_KEY, fallback=5.0)
+    return 5.0
+
+def load_export_retry_max_seconds():
+    """Loads the longest delay between retries of an unsaved sheet, in seconds, or returns 300."""
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+        return config.getfloat(DEFAULT_SECTION, EXPORT_RETRY_MAX_SECONDS_KEY, fallback=300.0)
+    return 300.0
@@ -12,10 +12,14 @@ from table import SignInTable
 from reader_thread import PaxtonReaderThread
 from dialogs import ask_for_name
 from system_toast import SystemToast
-from Generate import generate_staff_sign_in_form
-from config_manager import load_path
+from Generate import sheet_date_from_path, sheet_file_path
 from custom_calendar import CustomCalendar
-from database_manager import log_tap_event, get_all_staff, add_staff_member, get_taps_for_staff_and_date
+from database_manager import get_daily_summary, get_staff_in_building
+from db_worker import get_db_worker
+from tap_writer import get_tap_writer
+from db_maintenance import get_maintenance_scheduler
+from sheet_export import schedule_export, reconcile_export, flush_exports, pending_export_count
+from staff_directory import get_staff_directory
 
 
 class Scrim(QWidget):
@@ -90,15 +94,23 @@ class DashboardPage(QWidget):
         super().__init__(parent_main_window)
         self.parent_window = parent_main_window
         self.current_file_path = None
-        self.staff_data = {}
+        self.current_sheet_date = None
+        self.staff_directory = get_staff_directory()
+        self.db_worker = get_db_worker()
+        self.tap_writer = get_tap_writer()
+        self.maintenance = get_maintenance_scheduler()
         self.is_processing_swipe = False
         self.active_toasts = []
 
-        self.load_staff_data()
         self.setup_ui()
         self.setup_reader_thread()
         self.open_todays_sheet()
 
+        self.backlog_timer = QTimer(self)
+        self.backlog_timer.setInterval(1000)
+        self.backlog_timer.timeout.connect(self.update_backlog_indicator)
+        self.backlog_timer.start()
+
     def setup_ui(self):
         self.layout = QHBoxLayout(self)
         self.layout.setSpacing(0)
@@ -159,6 +171,13 @@ class DashboardPage(QWidget):
         self.members_count_label.raise_()
         self.members_count_label.hide()
 
+        # Shown while sheets are waiting to be saved (e.g. the day's file is open in Excel).
+        self.backlog_label = QLabel()
+        self.backlog_label.setFont(QFont(c.WIN_FONT_FAMILY, 9))
+        self.backlog_label.setStyleSheet(f"color: {c.WIN_COLOR_TEXT_SECONDARY};")
+        self.backlog_label.hide()
+        title_bar_layout.addWidget(self.backlog_label)
+
         title_bar_layout.addWidget(button_container)
         right_layout.addLayout(title_bar_layout)
 
@@ -232,12 +251,11 @@ class DashboardPage(QWidget):
         self.panel_animation.setEndValue(end_pos)
 
         if is_opening:
-            staff_in = self.table_widget.get_staff_in_building()
-            self.staff_list_widget.clear()
-            if staff_in:
-                for name in staff_in: self.staff_list_widget.addItem(QListWidgetItem(name))
+            if self.current_sheet_date:
+                self.db_worker.call(get_staff_in_building, self.current_sheet_date,
+                                    on_result=self.populate_staff_list)
             else:
-                self.staff_list_widget.addItem(QListWidgetItem("No staff currently clocked in."))
+                self.populate_staff_list([])
 
             self.scrim.show()
             self.side_panel.show()
@@ -247,6 +265,13 @@ class DashboardPage(QWidget):
             self.panel_animation.setDirection(QPropertyAnimation.Backward)
             self.panel_animation.start()
 
+    def populate_staff_list(self, staff_in):
+        self.staff_list_widget.clear()
+        if staff_in:
+            for name in staff_in: self.staff_list_widget.addItem(QListWidgetItem(name))
+        else:
+            self.staff_list_widget.addItem(QListWidgetItem("No staff currently clocked in."))
+
     @Slot()
     def on_panel_animation_finished(self):
         if self.panel_animation.direction() == QPropertyAnimation.Backward:
@@ -272,163 +297,169 @@ class DashboardPage(QWidget):
         self.reader_thread.status_signal.connect(lambda msg: print(f"Reader Status: {msg}"))
         self.reader_thread.start()
 
-    def load_staff_data(self):
-        try:
-            all_staff = get_all_staff()
-            self.staff_data = {member['token']: member['name'] for member in all_staff}
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", f"Could not load staff data from database: {e}")
-
     @Slot(int)
     def process_card_swipe(self, token):
+        self.maintenance.note_activity()
         if not self.current_file_path:
             self.show_toast("Action Required", "Please generate a sheet before swiping cards.")
             return
 
+        # Swipes are ignored while the registration dialog is open.
         if self.is_processing_swipe: return
-        try:
-            self.is_processing_swipe = True
-            if token in self.staff_data:
-                staff_name = self.staff_data[token]
-
-                try:
-                    file_name = os.path.basename(self.current_file_path)
-                    date_part = os.path.splitext(file_name)[0]
-                    sheet_date = datetime.strptime(date_part, '%m-%d-%Y').date()
-                    query_date_str = sheet_date.strftime('%Y-%m-%d')
-
-                    previous_taps = get_taps_for_staff_and_date(staff_name, query_date_str)
-                    total_taps_today = len(previous_taps) + 1
-
-                    first_tap_time = previous_taps[0] if previous_taps else None
-
-                    now_time = datetime.now().time()
-                    full_datetime = datetime.combine(sheet_date, now_time)
-                    db_timestamp = full_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                    db_event_date = full_datetime.strftime("%Y-%m-%d")
-                    log_tap_event(staff_name, token, db_timestamp, db_event_date)
-
-                    time_now_str = full_datetime.strftime("%I:%M:%S %p")
-
-                    # First, update the Excel file in the background
-                    status, _ = self.table_widget.record_swipe(
-                        self.current_file_path, staff_name, time_now_str,
-                        total_taps_today, first_tap_time_str=first_tap_time
-                    )
-
-                    # MODIFICATION: Instead of reloading the whole table, update the view directly.
-                    # This is faster and avoids the visual glitch.
-                    row_to_highlight = self.table_widget.update_view_for_swipe(
-                        staff_name, time_now_str, total_taps_today
-                    )
-
-                except Exception as e:
-                    # Fallback logic remains largely the same
-                    log_tap_event(staff_name, token)
-                    time_now_str = datetime.now().strftime("%I:%M:%S %p")
-                    total_taps_today = 1
-                    status, _ = self.table_widget.record_swipe(
-                        self.current_file_path, staff_name, time_now_str,
-                        total_taps_today, first_tap_time_str=None
-                    )
-                    row_to_highlight = self.table_widget.update_view_for_swipe(
-                        staff_name, time_now_str, total_taps_today
-                    )
-                    QMessageBox.warning(self, "Logic Error",
-                                        f"Could not determine tap count, used fallback logic.\n{e}")
-
-                parts = status.split(': ', 1)
-                if len(parts) == 2:
-                    action, name = parts
-                    if "Clocked In" in action:
-                        self.show_toast(action, name, status='success')
-                    elif "Clocked Out" in action:
-                        self.show_toast(action, name, status='error')
-                    else:
-                        self.show_toast(action, name, status='info')
-
-                # MODIFICATION: Do NOT reload the entire table from the file anymore.
-                # self.display_excel_content(self.current_file_path)
-
-                highlight_color = QColor(c.WIN_COLOR_ACCENT_PRIMARY)
-                self.table_widget.highlight_row(row_to_highlight, highlight_color)
-            else:
+        staff_name = self.staff_directory.name_for(token)
+        if staff_name is None:
+            try:
+                self.is_processing_swipe = True
                 self.register_new_user(token)
-        finally:
-            self.is_processing_swipe = False
-            self.update_members_button_tooltip()
-
-    def register_new_user(self, token):
-        user_name = ask_for_name(self, token)
-        if not user_name:
-            self.show_toast("Cancelled", "Registration cancelled.", status='info')
-            return
-
-        if not add_staff_member(token, user_name):
-            QMessageBox.warning(self, "Registration Failed", "This token or name may already be in use.")
+            finally:
+                self.is_processing_swipe = False
             return
 
-        self.staff_data[token] = user_name
+        self.submit_tap(token, staff_name)
 
-        total_taps_today = 1
-        full_datetime = None
+    def submit_tap(self, token, staff_name):
+        """
+        Queues the tap on the group-commit writer. Once it is committed the
+        worker reads the day's summary, and on_tap_recorded updates the sheet.
+        """
         try:
-            file_name = os.path.basename(self.current_file_path)
-            date_part = os.path.splitext(file_name)[0]
-            sheet_date = datetime.strptime(date_part, '%m-%d-%Y').date()
-
-            now_time = datetime.now().time()
-            full_datetime = datetime.combine(sheet_date, now_time)
-            db_timestamp = full_datetime.strftime("%Y-%m-%d %H:%M:%S")
-            db_event_date = full_datetime.strftime("%Y-%m-%d")
-            log_tap_event(user_name, token, db_timestamp, db_event_date)
-        except Exception:
-            log_tap_event(user_name, token)
-
-        if self.parent_window and hasattr(self.parent_window, 'members_page'):
-            self.parent_window.members_page.staff_data_changed.emit()
-
-        time_now_str = full_datetime.strftime("%I:%M:%S %p") if full_datetime else datetime.now().strftime(
-            "%I:%M:%S %p")
-
-        # Update Excel file
-        status, _ = self.table_widget.record_swipe(
-            self.current_file_path, user_name, time_now_str, total_taps_today, first_tap_time_str=None
-        )
+            full_datetime = datetime.combine(self.current_sheet_date, datetime.now().time())
+        except TypeError:
+            full_datetime = datetime.now()
+        file_path = self.current_file_path
+
+        def on_error(e):
+            self.on_tap_recorded(file_path, staff_name, full_datetime, None, e)
+
+        def on_logged(logged):
+            if not logged:
+                on_error(None)
+                return
+            self.db_worker.call(
+                get_daily_summary, token, full_datetime,
+                on_result=lambda summary: self.on_tap_recorded(file_path, staff_name, full_datetime, summary),
+                on_error=on_error
+            )
+
+        self.db_worker.deliver(self.tap_writer.submit(token, full_datetime),
+                               on_result=on_logged, on_error=on_error)
+
+    def on_tap_recorded(self, file_path, staff_name, full_datetime, summary, error=None):
+        if summary is None:
+            reason = error or "No active staff member holds this card."
+            QMessageBox.warning(self, "Tap Not Saved", f"The tap for {staff_name} could not be saved.\n{reason}")
+            return
 
-        # Update view
-        row_to_highlight = self.table_widget.update_view_for_swipe(user_name, time_now_str, total_taps_today)
+        # The summary row already includes the tap just logged.
+        time_now_str = full_datetime.strftime("%I:%M:%S %p")
+        total_taps_today = summary['tap_count']
+        first_tap_time = summary['first_in'].strftime("%I:%M:%S %p")
+
+        # The database is the record; update the view directly and re-export
+        # the sheet in the background.
+        status, row_to_highlight = f"Tap Recorded: {staff_name}", -1
+        if file_path == self.current_file_path and self.table_widget.is_loading():
+            # The load in progress would overwrite a direct update; reload once this tap is exported.
+            self.table_widget.refresh_from_database(full_datetime.date(), highlight_name=staff_name)
+        elif file_path == self.current_file_path:
+            status, row_to_highlight = self.table_widget.update_view_for_swipe(
+                staff_name, time_now_str, total_taps_today, first_tap_time_str=first_tap_time
+            )
+        self.export_sheet(full_datetime.date())
 
         parts = status.split(': ', 1)
         if len(parts) == 2:
             action, name = parts
-            self.show_toast(action, name, status='success')
-
-        # Do not reload table
-        # self.display_excel_content(self.current_file_path)
+            if "Clocked In" in action:
+                self.show_toast(action, name, status='success')
+            elif "Clocked Out" in action:
+                self.show_toast(action, name, status='error')
+            else:
+                self.show_toast(action, name, status='info')
 
         highlight_color = QColor(c.WIN_COLOR_ACCENT_PRIMARY)
         self.table_widget.highlight_row(row_to_highlight, highlight_color)
+        self.update_members_button_tooltip()
 
-    def generate_or_load_sheet_for_date(self, selected_date):
-        save_dir = load_path()
-        file_path = os.path.join(save_dir, f"{selected_date.strftime('%#m-%#d-%Y')}.xlsx")
+    def export_sheet(self, sheet_date):
+        """
+        Queues a re-render of a day's xlsx sheet; bursts of swipes are saved
+        together. A sheet that cannot be saved is retried in the background
+        and counted by the backlog indicator.
+        """
+        schedule_export(sheet_date)
+
+    def update_backlog_indicator(self):
+        depth = pending_export_count()
+        if depth:
+            days = "day" if depth == 1 else "days"
+            self.backlog_label.setText(f"Sheet updates waiting for {depth} {days} (file in use)")
+            self.backlog_label.setToolTip("The sign-in sheet could not be saved, usually because it is open "
+                                          "in Excel. Swipes are still recorded; the sheet is saved "
+                                          "automatically once the file is closed.")
+        self.backlog_label.setVisible(bool(depth))
+
+    def register_new_user(self, token):
+        user_name = ask_for_name(self, token)
+        if not user_name:
+            self.show_toast("Cancelled", "Registration cancelled.", status='info')
+            return
+
+        def on_added(ok):
+            if not ok:
+                QMessageBox.warning(self, "Registration Failed", "This token or name may already be in use.")
+                return
+            self.submit_tap(token, user_name)
+
+        self.staff_directory.add(token, user_name, on_done=on_added)
 
-        if os.path.exists(file_path):
+    def generate_or_load_sheet_for_date(self, selected_date):
+        file_path = sheet_file_path(selected_date)
+        modified = self._modified_time(file_path)
+        if modified is not None:
             self.display_excel_content(file_path)
-        else:
-            new_file_path = generate_staff_sign_in_form(target_date=selected_date)
-            if new_file_path:
-                self.display_excel_content(new_file_path)
+
+        # Taps committed just before a crash or quit may never have reached the
+        # file; reconcile_export re-exports the days whose sheet may be behind.
+        def on_exported(new_file_path):
+            if modified is None:
+                # A new sheet, blank if nobody tapped that day. If it could not be
+                # saved, the day is shown from the database until it is.
+                self.display_excel_content(new_file_path or file_path)
+            elif self.current_sheet_date == selected_date and (
+                    new_file_path is None or self._modified_time(file_path) != modified):
+                # The file was behind the database; show the reconciled day.
+                self.display_excel_content(file_path)
+
+        export = reconcile_export(selected_date)
+        if export is not None:
+            self.db_worker.deliver(export, on_result=on_exported, on_error=lambda e: on_exported(None))
+
+    @staticmethod
+    def _modified_time(file_path):
+        try:
+            return os.path.getmtime(file_path)
+        except OSError:
+            return None
 
     def open_todays_sheet(self):
         todays_date = date.today()
         self.generate_or_load_sheet_for_date(todays_date)
 
     def display_excel_content(self, file_path):
+        try:
+            sheet_date = sheet_date_from_path(file_path)
+        except ValueError:
+            sheet_date = None
+        if sheet_date != self.current_sheet_date:
+            # Write out the previous day's pending updates before moving on.
+            flush_exports()
         self.current_file_path = file_path
-        file_date_str = self.table_widget.display_excel_content(file_path)
+        self.current_sheet_date = sheet_date
+        self.table_widget.display_excel_content(file_path, on_done=self.on_sheet_loaded)
 
+    def on_sheet_loaded(self, file_date_str):
+        file_path = self.current_file_path
         if file_date_str:
             try:
                 dt_obj = datetime.strptime(file_date_str, "%m/%d/%Y")
@@ -459,13 +490,9 @@ class DashboardPage(QWidget):
             return
 
         try:
-            base_name = os.path.basename(self.current_file_path)
-            file_date_str = os.path.splitext(base_name)[0]
-            file_date = datetime.strptime(file_date_str, "%m-%d-%Y").date()
-
             py_date = selected_qdate.toPython()
 
-            is_sheet_open = (file_date == py_date)
+            is_sheet_open = (self.current_sheet_date == py_date)
             button.setEnabled(not is_sheet_open)
             button.setText("Open")
 
@@ -474,12 +501,17 @@ class DashboardPage(QWidget):
             button.setText("Open")
 
     def update_members_button_tooltip(self):
-        if not self.table_container.isVisible():
+        if not self.table_container.isVisible() or not self.current_sheet_date:
             self.members_button.setToolTip("No sheet is active.")
             self.members_count_label.hide()
             return
 
-        staff_in_list = self.table_widget.get_staff_in_building()
+        self.db_worker.call(get_staff_in_building, self.current_sheet_date,
+                            on_result=self.apply_staff_in_building)
+
+    def apply_staff_in_building(self, staff_in_list):
+        if not self.side_panel.isHidden():
+            self.populate_staff_list(staff_in_list)
         count = len(staff_in_list)
 
         if count > 0:
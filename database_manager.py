@@ -1,169 +1,863 @@
 # database_manager.py
 import sqlite3
 import os
-from datetime import datetime
+import threading
+from itertools import groupby
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from config_manager import (
+    load_db_profile, load_partitioned_storage, load_query_logging, load_slow_query_ms, load_explain_slow_queries
+)
+from db_instrumentation import QueryStats, make_connection_factory
+from schema_migrations import apply_migrations
+from tap_partitions import PartitionSet
 
 # Define the database file path
 DB_FILE = 'tap_history.db' # This file will be created in the same directory as main.py
+QUERY_STATS_FILE = 'db_query_stats.json' # Written on shutdown when QueryLogging is enabled
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    try:
-        conn = sqlite3.connect(DB_FILE)
+# Pragmas applied to every new connection, selected with DatabaseProfile in config.ini.
+# All profiles use WAL so readers (history dialog, members page) never block the swipe path.
+PRAGMA_PROFILES = {
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',        # fsync on every commit
+        'cache_size': -4000,          # KiB
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 10000,        # ms
+        'wal_autocheckpoint': 1000,   # pages
+        'journal_size_limit': 16 * 1024 * 1024,
+    },
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',      # fsync only at checkpoints
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+        'journal_size_limit': 32 * 1024 * 1024,
+    },
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',         # OS crash may lose the last commits
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 4000,
+        'journal_size_limit': 64 * 1024 * 1024,
+    },
+}
+DEFAULT_PROFILE = 'balanced'
+
+# The subset of a profile that applies to read-only reporting connections.
+READ_ONLY_PRAGMAS = ('cache_size', 'mmap_size', 'temp_store', 'busy_timeout')
+
+# How many times a write is attempted when the database stays locked past the busy timeout.
+BUSY_RETRIES = 3
+
+# tap_events stores local wall-clock times as seconds since this epoch (ts)
+# and whole days since it (day), so date filters are integer comparisons.
+EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+def to_epoch(dt):
+    """Converts a naive local datetime to integer epoch seconds."""
+    return (dt.toordinal() - _EPOCH_ORDINAL) * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def from_epoch(ts):
+    """Converts integer epoch seconds back to a naive local datetime."""
+    return EPOCH + timedelta(seconds=ts)
+
+
+def to_day(value):
+    """Returns the day number for a date, datetime or 'YYYY-MM-DD' string."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def from_day(day):
+    """Converts a day number back to a date."""
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+class ConnectionManager:
+    """
+    Hands out one long-lived SQLite connection per thread (GUI thread, reader
+    thread, ...) so callers no longer pay connect and cache warmup costs on
+    every query. All connections are closed together by close_all().
+    With read_only=True the connections are opened with URI mode=ro and
+    query_only, for reports that must never write or take write locks.
+    """
+
+    def __init__(self, db_file, profile=None, read_only=False):
+        self.db_file = db_file
+        self.profile = profile
+        self.read_only = read_only
+        self.stats = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+
+    def _pragmas(self):
+        if self.profile is None:
+            self.profile = load_db_profile()
+        if self.profile not in PRAGMA_PROFILES:
+            print(f"Unknown database profile '{self.profile}', using '{DEFAULT_PROFILE}'.")
+            self.profile = DEFAULT_PROFILE
+        return PRAGMA_PROFILES[self.profile]
+
+    def _open(self):
+        pragmas = self._pragmas()
+        factory = make_connection_factory(self.stats) if self.stats else sqlite3.Connection
+        if self.read_only:
+            target = f"file:{os.path.abspath(self.db_file)}?mode=ro"
+            pragmas = {name: pragmas[name] for name in READ_ONLY_PRAGMAS}
+        else:
+            target = self.db_file
+        conn = sqlite3.connect(target, check_same_thread=False, uri=self.read_only,
+                               timeout=pragmas['busy_timeout'] / 1000, factory=factory)
         conn.row_factory = sqlite3.Row # Allows accessing columns by name
+        conn.execute("PRAGMA query_only = ON" if self.read_only else "PRAGMA foreign_keys = ON")
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
         return conn
+
+    def connection(self):
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self._open()
+            with self._lock:
+                self._connections.append(conn)
+                self._local.generation = self._generation
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the enclosed block in a single transaction on the thread's
+        connection. Commits on success, rolls back on error. Nested blocks
+        join the outermost transaction. The write lock is taken up front
+        (BEGIN IMMEDIATE): a block that reads before it writes would otherwise
+        fail at once with SQLITE_BUSY if another connection committed in
+        between, instead of waiting out the busy timeout.
+        """
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._local.depth = 1
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.depth = 0
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Runs the enclosed block against one consistent snapshot of the
+        database: a read transaction whose view is fixed by its first read.
+        In WAL mode the snapshot never blocks writers. Nested blocks share
+        the outermost snapshot.
+        """
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._local.depth = 1
+        conn.execute("BEGIN")
+        try:
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # pins the snapshot
+            yield conn
+        finally:
+            conn.rollback()
+            self._local.depth = 0
+
+    def set_stats(self, stats):
+        """Switches statement instrumentation on (a QueryStats) or off (None)."""
+        self.close_all()
+        self.stats = stats
+
+    def set_profile(self, profile):
+        """Switches pragma profile; open connections are closed and reopened on next use."""
+        self.close_all()
+        self.profile = profile
+
+    def checkpoint(self, mode='PASSIVE'):
+        """
+        Copies WAL content back into the database file. PASSIVE never blocks
+        writers; TRUNCATE also resets the -wal file to zero bytes.
+        Returns (busy, wal_pages, checkpointed_pages) or None on error.
+        """
+        try:
+            row = self.connection().execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            return tuple(row)
+        except sqlite3.Error as e:
+            print(f"Error running WAL checkpoint: {e}")
+            return None
+
+    def close_all(self):
+        """
+        Checkpoints the WAL and closes every connection handed out so far.
+        Safe to call more than once.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        if connections and not self.read_only:
+            try:
+                connections[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                print(f"Error running WAL checkpoint: {e}")
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing database connection: {e}")
+
+
+_manager = ConnectionManager(DB_FILE)
+_readers = ConnectionManager(DB_FILE, read_only=True)
+_partitions = PartitionSet(DB_FILE)
+
+
+def get_db_connection():
+    """
+    Returns the calling thread's pooled connection to the SQLite database.
+    The connection is shared, so callers must not close it.
+    """
+    try:
+        return _manager.connection()
     except sqlite3.Error as e:
         print(f"Database connection error: {e}")
         return None
 
+
+def transaction():
+    """Context manager yielding the thread's connection inside one transaction."""
+    return _manager.transaction()
+
+
+@contextmanager
+def read_snapshot(start_date=None, end_date=None):
+    """
+    Context manager yielding the thread's read-only reporting connection
+    inside one WAL snapshot, so long reads see consistent data and never
+    contend with tap writes. Pass a date range to attach the archives it
+    needs up front; ATTACH cannot run once the snapshot is open. A range may
+    need at most MAX_ATTACHED archives; use _partition_snapshots for longer ones.
+    """
+    conn = _readers.connection()
+    if start_date is not None and not conn.in_transaction:
+        _partitions.schemas_for_range(conn, to_day(start_date), to_day(end_date or start_date))
+    with _readers.snapshot() as conn:
+        yield conn
+
+
+def _partition_snapshots(start_date, end_date):
+    """
+    Yields (conn, schema, first_day, last_day) for each storage partition of an
+    inclusive date range, oldest first, each read in its own snapshot. A range
+    can span more archived years than SQLite can attach at once, so archives
+    are attached one at a time instead of all up front.
+    """
+    for _, first_day, last_day in _partitions.split_range(to_day(start_date), to_day(end_date)):
+        with read_snapshot(from_day(first_day), from_day(last_day)) as conn:
+            yield conn, _partitions.schema_for_day(conn, first_day), first_day, last_day
+
+
+def checkpoint(mode='PASSIVE'):
+    """Runs a WAL checkpoint on the thread's connection."""
+    return _manager.checkpoint(mode)
+
+
+def close_connections():
+    """Shutdown hook: checkpoints the WAL and closes all pooled connections."""
+    if _manager.stats:
+        dump_query_stats()
+    _readers.close_all()
+    _manager.close_all()
+
+
+# --- QUERY INSTRUMENTATION ---
+
+def enable_query_instrumentation(slow_threshold_ms=None, explain_slow=None):
+    """
+    Times every statement on connections opened from now on, including the
+    read-only reporting connections; both share one set of statistics.
+    Defaults come from SlowQueryMs and ExplainSlowQueries in config.ini.
+    """
+    if slow_threshold_ms is None:
+        slow_threshold_ms = load_slow_query_ms()
+    if explain_slow is None:
+        explain_slow = load_explain_slow_queries()
+    stats = QueryStats(slow_threshold_ms, explain_slow)
+    _manager.set_stats(stats)
+    _readers.set_stats(stats)
+
+
+def setup_query_instrumentation():
+    """Enables instrumentation when QueryLogging is set in config.ini."""
+    if load_query_logging():
+        enable_query_instrumentation()
+
+
+def get_query_stats():
+    """Returns per-statement calls, rows, latency totals and histograms (slowest first)."""
+    return _manager.stats.snapshot() if _manager.stats else []
+
+
+def get_slow_queries():
+    """Returns the slow-query log, oldest first."""
+    return _manager.stats.slow_queries() if _manager.stats else []
+
+
+def reset_query_stats():
+    if _manager.stats:
+        _manager.stats.reset()
+
+
+def dump_query_stats(path=QUERY_STATS_FILE):
+    """Writes the collected statistics to a JSON file. Returns False if disabled or on error."""
+    if not _manager.stats:
+        return False
+    try:
+        _manager.stats.dump(path)
+        return True
+    except OSError as e:
+        print(f"Error writing query stats: {e}")
+        return False
+
+
 def create_tables():
-    """Creates all necessary tables if they don't exist."""
+    """
+    Brings the database schema up to date, including every per-year archive.
+    When the schema is already current this is one PRAGMA user_version read
+    per database file and no DDL runs.
+    """
     conn = get_db_connection()
     if conn:
         try:
-            cursor = conn.cursor()
-            # Tap Events Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tap_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    staff_name TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    event_date TEXT NOT NULL, -- YYYY-MM-DD format for easy querying by date
-                    token INTEGER NOT NULL
-                )
-            ''')
-            # Staff Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS staff (
-                    token INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL UNIQUE
-                )
-            ''')
-            conn.commit()
-            print("Database tables checked/created successfully.")
+            applied = apply_migrations(conn)
+            if applied:
+                print(f"Database schema migrated to version {applied[-1]}.")
         except sqlite3.Error as e:
-            print(f"Error creating tables: {e}")
-        finally:
-            conn.close()
+            print(f"Error migrating database schema: {e}")
+        try:
+            _partitions.sync_archives(conn)
+        except sqlite3.Error as e:
+            print(f"Error updating archive schemas: {e}")
 
 
-def log_tap_event(staff_name, token, timestamp=None, event_date=None):
-    """Logs a single tap event to the database."""
+def archive_closed_years():
+    """
+    When PartitionedStorage is enabled, moves every year before the current
+    one into its own tap_history_<year>.db file. Returns the archived years.
+    """
+    if not load_partitioned_storage():
+        return []
     conn = get_db_connection()
     if conn:
-        if timestamp is None:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if event_date is None:
-            event_date = datetime.now().strftime("%Y-%m-%d") # Format: YYYY-MM-DD
+        try:
+            archived = _partitions.archive_closed_years(conn)
+            if archived:
+                print(f"Archived tap history for {', '.join(map(str, archived))}.")
+            return archived
+        except sqlite3.Error as e:
+            print(f"Error archiving tap history: {e}")
+    return []
+
+
+def get_partition_files():
+    """Returns the paths of the per-year archive files that exist on disk."""
+    return [_partitions.archive_path(year) for year in sorted(_partitions.years())]
 
+
+def _retry_when_busy(fn, *args):
+    """Runs fn(*args), running it again if the database is still locked after the busy timeout."""
+    for attempt in range(1, BUSY_RETRIES + 1):
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO tap_events (staff_name, timestamp, event_date, token) VALUES (?, ?, ?, ?)",
-                (staff_name, timestamp, event_date, token)
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if attempt == BUSY_RETRIES or not ('locked' in str(e) or 'busy' in str(e)):
+                raise
+            print(f"Database busy ({e}); retrying, attempt {attempt + 1} of {BUSY_RETRIES}.")
+
+def log_tap_events(taps):
+    """
+    Logs many taps in a single transaction, one executemany per partition.
+    `taps` is an iterable of (token, when) pairs; a `when` of None means now.
+    Returns one boolean per tap, False where no active staff member holds the
+    token. This is the bulk path for importers and the group-commit writer.
+    Raises sqlite3.Error if the batch could not be written, so a failed write
+    is never mistaken for an unknown card.
+    """
+    now = datetime.now()
+    taps = [(token, to_epoch(when or now)) for token, when in taps]
+    if not taps:
+        return []
+    return _retry_when_busy(_insert_taps, taps)
+
+def _insert_taps(taps):
+    # Resolve partitions before the transaction; ATTACH cannot run inside one.
+    conn = _manager.connection()
+    schemas = {day: _partitions.schema_for_day(conn, day) for day in {ts // 86400 for _, ts in taps}}
+
+    results = []
+    with transaction() as conn:
+        tokens = sorted({token for token, _ in taps})
+        staff_ids = {}
+        for i in range(0, len(tokens), 500):  # stay under SQLite's host parameter limit
+            chunk = tokens[i:i + 500]
+            rows = conn.execute(
+                f"SELECT token, id FROM staff WHERE active = 1 AND token IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            staff_ids.update((row['token'], row['id']) for row in rows)
+
+        rows_by_schema = {}
+        for token, ts in taps:
+            staff_id = staff_ids.get(token)
+            results.append(staff_id is not None)
+            if staff_id is not None:
+                rows_by_schema.setdefault(schemas[ts // 86400], []).append((staff_id, ts, ts // 86400))
+
+        for schema, rows in rows_by_schema.items():
+            conn.executemany(f"INSERT INTO {schema}.tap_events (staff_id, ts, day) VALUES (?, ?, ?)", rows)
+    return results
+
+def record_manual_tap(token, when, action):
+    """
+    Records a manual clock-in ('in') or clock-out ('out') for the staff member
+    holding `token`. A clock-in is only allowed before their first tap of the
+    day and a clock-out only while they are clocked in, no earlier than their
+    clock-in. Returns a status
+    message; refused or failed entries start with 'Error:'.
+    """
+    try:
+        return _retry_when_busy(_insert_manual_tap, token, to_epoch(when), action)
+    except sqlite3.Error as e:
+        print(f"Error recording manual entry: {e}")
+        return f"Error: Could not record the entry ({e})."
+
+def _insert_manual_tap(token, ts, action):
+    day = ts // 86400
+    schema = _partitions.schema_for_day(_manager.connection(), day)
+    with transaction() as conn:
+        staff = conn.execute("SELECT id, name FROM staff WHERE token = ? AND active = 1", (token,)).fetchone()
+        if staff is None:
+            return f"Error: No staff member holds token {token}."
+        name = staff['name']
+        summary = conn.execute(
+            f"SELECT first_in, clocked_out FROM {schema}.daily_summary WHERE staff_id = ? AND day = ?",
+            (staff['id'], day)
+        ).fetchone()
+        if action == 'in' and summary is not None:
+            return f"Error: {name} is already on today's sheet."
+        if action == 'out' and summary is None:
+            return f"Error: {name} has not clocked in today."
+        if action == 'out' and summary['clocked_out']:
+            return f"Error: {name} is already clocked out."
+        if action == 'out' and ts < summary['first_in']:
+            clock_in = from_epoch(summary['first_in']).strftime("%I:%M:%S %p")
+            return f"Error: The clock-out time is earlier than {name}'s clock-in at {clock_in}."
+        conn.execute(
+            f"INSERT INTO {schema}.tap_events (staff_id, ts, day, kind) VALUES (?, ?, ?, ?)",
+            (staff['id'], ts, day, 'manual_in' if action == 'in' else 'manual_out')
+        )
+    return f"Clocked In: {name}" if action == 'in' else f"Clocked Out: {name}"
+
+def delete_day_entry(staff_name, query_date):
+    """
+    Removes a staff member from one day's sheet. Their taps are marked deleted
+    rather than removed, so the tap history keeps them; the day's summary,
+    sheet and exports no longer count them. Returns True on success.
+    """
+    day = to_day(query_date)
+    try:
+        schema = _partitions.schema_for_day(_manager.connection(), day)
+        with transaction() as conn:
+            conn.execute(
+                f"UPDATE {schema}.tap_events SET deleted = 1 "
+                "WHERE day = ? AND deleted = 0 AND staff_id IN (SELECT id FROM main.staff WHERE name = ?)",
+                (day, staff_name)
             )
-            conn.commit()
-            print(f"Tap event logged for {staff_name} at {timestamp}.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error deleting entry: {e}")
+        return False
+
+def _tap_times(staff_column, value, query_date):
+    # Not limited to active staff: the history of a day outlives a member's
+    # removal, and a name or card may since have passed to someone else.
+    try:
+        day = to_day(query_date)
+        with read_snapshot(query_date) as conn:
+            schema = _partitions.schema_for_day(conn, day)
+            rows = conn.execute(
+                f"SELECT t.ts FROM staff s JOIN {schema}.tap_events t ON t.staff_id = s.id AND t.day = ? "
+                f"WHERE s.{staff_column} = ? ORDER BY t.ts ASC",
+                (day, value)
+            ).fetchall()
+        return [from_epoch(row[0]) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error retrieving taps: {e}")
+    return []
+
+def get_tap_times(token, query_date):
+    """
+    Returns the tap times of the staff member holding `token` on one day as
+    datetime objects, oldest first, including taps deleted from the sheet and
+    taps of staff since removed. query_date may be a date or a 'YYYY-MM-DD' string.
+    """
+    return _tap_times('token', token, query_date)
+
+def get_taps_for_staff_and_date(staff_name, query_date):
+    """
+    Retrieves all tap events for a given staff member on a specific date,
+    formatted for display ('hh:mm:ss AM'). Taps deleted from the sheet, and
+    those of staff since removed from the roster, are still listed; the
+    history keeps them.
+    """
+    return [tap.strftime("%I:%M:%S %p") for tap in _tap_times('name', staff_name, query_date)]
+
+def iter_taps_in_range(start_date, end_date, tokens=None):
+    """
+    Streams tap history for an inclusive date range with one indexed query per
+    storage partition. Yields (name, token, day, taps) per staff member per
+    day, ordered by day, where day is a date and taps is that day's list of
+    datetimes. Pass `tokens` to restrict the result to a set of staff. Rows are
+    read from the cursor as they are consumed, so memory use does not grow
+    with the range. Each storage partition is read from its own read-only
+    snapshot. Taps deleted from their sheet are left out. Raises sqlite3.Error
+    if the history cannot be read.
+    """
+    staff_filter, staff_params = "", []
+    if tokens is not None:
+        staff_params = list(tokens)
+        if not staff_params:
+            return
+        staff_filter = f" AND s.token IN ({', '.join('?' * len(staff_params))})"
+
+    try:
+        for conn, schema, first_day, last_day in _partition_snapshots(start_date, end_date):
+            cursor = conn.execute(
+                "SELECT t.day, t.staff_id, t.ts, s.name, s.token "
+                f"FROM {schema}.tap_events t JOIN staff s ON s.id = t.staff_id "
+                f"WHERE t.day BETWEEN ? AND ? AND t.deleted = 0{staff_filter} "
+                "ORDER BY t.day, t.staff_id, t.ts",
+                [first_day, last_day] + staff_params
+            )
+            for (day, _), rows in groupby(cursor, key=lambda row: (row[0], row[1])):
+                rows = list(rows)
+                yield rows[0]['name'], rows[0]['token'], from_day(day), [from_epoch(row[2]) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error retrieving taps for range: {e}")
+        raise
+
+def iter_tap_events(start_date, end_date):
+    """
+    Streams every tap in an inclusive date range, one read-only snapshot per
+    storage partition, ordered by day, staff member and time. Yields (day, staff_id, name, token,
+    when, kind) tuples, where day is a date and when a datetime. Rows come
+    straight off the cursor, so memory use does not grow with the range.
+    Raises sqlite3.Error if the history cannot be read: an export must fail
+    rather than end early.
+    """
+    try:
+        for conn, schema, first_day, last_day in _partition_snapshots(start_date, end_date):
+            cursor = conn.execute(
+                "SELECT t.day, t.staff_id, s.name, s.token, t.ts, t.kind "
+                f"FROM {schema}.tap_events t JOIN staff s ON s.id = t.staff_id "
+                "WHERE t.day BETWEEN ? AND ? AND t.deleted = 0 "
+                "ORDER BY t.day, t.staff_id, t.ts",
+                (first_day, last_day)
+            )
+            for day, staff_id, name, token, ts, kind in cursor:
+                yield from_day(day), staff_id, name, token, from_epoch(ts), kind
+    except sqlite3.Error as e:
+        print(f"Error retrieving tap events for range: {e}")
+        raise
+
+def _summary_from_row(row):
+    return {
+        'name': row['name'],
+        'token': row['token'],
+        'first_in': from_epoch(row['first_in']),
+        'last_tap': from_epoch(row['last_tap']),
+        'clock_out': from_epoch(row['clock_out']) if row['clock_out'] is not None else None,
+        'tap_count': row['tap_count'],
+        'clocked_out': bool(row['clocked_out']),
+    }
+
+def get_daily_summary(token, query_date):
+    """
+    Returns the attendance summary of the staff member holding `token` for one
+    day (first_in, last_tap, clock_out, tap_count, clocked_out), or None if
+    they have not tapped that day. This is a single primary-key lookup.
+    """
+    conn = get_db_connection()
+    if conn:
+        try:
+            day = to_day(query_date)
+            schema = _partitions.schema_for_day(conn, day)
+            row = conn.execute(
+                "SELECT s.name, s.token, d.first_in, d.last_tap, d.clock_out, d.tap_count, d.clocked_out "
+                f"FROM staff s JOIN {schema}.daily_summary d ON d.staff_id = s.id AND d.day = ? "
+                "WHERE s.token = ? AND s.active = 1",
+                (day, token)
+            ).fetchone()
+            if row:
+                return _summary_from_row(row)
         except sqlite3.Error as e:
-            print(f"Error logging tap event: {e}")
-        finally:
-            conn.close()
+            print(f"Error retrieving daily summary: {e}")
+    return None
+
+def get_daily_summaries(query_date):
+    """
+    Returns the summaries of everyone who tapped on one day, in order of first
+    tap. Read from a read-only snapshot, for reports.
+    """
+    summaries = []
+    try:
+        day = to_day(query_date)
+        with read_snapshot(query_date) as conn:
+            schema = _partitions.schema_for_day(conn, day)
+            rows = conn.execute(
+                "SELECT s.name, s.token, d.first_in, d.last_tap, d.clock_out, d.tap_count, d.clocked_out "
+                f"FROM {schema}.daily_summary d JOIN staff s ON s.id = d.staff_id "
+                "WHERE d.day = ? ORDER BY d.first_in ASC",
+                (day,)
+            ).fetchall()
+        summaries = [_summary_from_row(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error retrieving daily summaries: {e}")
+    return summaries
 
-def get_taps_for_staff_and_date(staff_name, query_date_str):
+def _manual_remark(kinds):
+    if 'manual_in' in kinds and 'manual_out' in kinds:
+        return "Manually Clocked In/Out"
+    if 'manual_in' in kinds:
+        return "Manually Clocked In"
+    if 'manual_out' in kinds:
+        return "Manually Clocked Out"
+    return ""
+
+def get_day_sheet(query_date):
     """
-    Retrieves all tap events for a given staff member on a specific date.
-    query_date_str should be in 'YYYY-MM-DD' format.
+    Returns the rows of one day's sign-in sheet, rebuilt from the database in
+    order of first tap. Each row is a dict with name, clock_in, clock_out
+    (datetime or None), remarks and taps (datetimes, oldest first).
+    Returns [] on a database error; use fetch_day_sheet where an empty day
+    must not be confused with a failed read.
     """
+    try:
+        return fetch_day_sheet(query_date)
+    except sqlite3.Error as e:
+        print(f"Error retrieving sheet rows: {e}")
+        return []
+
+def fetch_day_sheet(query_date):
+    """Like get_day_sheet, but raises sqlite3.Error instead of returning no rows."""
+    day = to_day(query_date)
+    with read_snapshot(query_date) as conn:
+        schema = _partitions.schema_for_day(conn, day)
+        summaries = conn.execute(
+            "SELECT d.staff_id, s.name, d.first_in, d.clock_out "
+            f"FROM {schema}.daily_summary d JOIN staff s ON s.id = d.staff_id "
+            "WHERE d.day = ? ORDER BY d.first_in, d.staff_id",
+            (day,)
+        ).fetchall()
+        taps = conn.execute(
+            f"SELECT staff_id, ts, kind FROM {schema}.tap_events WHERE day = ? AND deleted = 0 "
+            "ORDER BY staff_id, ts",
+            (day,)
+        ).fetchall()
+
+    sheet = []
+    taps_by_staff = {staff_id: list(rows) for staff_id, rows in groupby(taps, key=lambda row: row['staff_id'])}
+    for summary in summaries:
+        staff_taps = taps_by_staff.get(summary['staff_id'], [])
+        sheet.append({
+            'name': summary['name'],
+            'clock_in': from_epoch(summary['first_in']),
+            'clock_out': from_epoch(summary['clock_out']) if summary['clock_out'] is not None else None,
+            'remarks': _manual_remark({row['kind'] for row in staff_taps}),
+            'taps': [from_epoch(row['ts']) for row in staff_taps],
+        })
+    return sheet
+
+def get_tap_days(start_date, end_date):
+    """
+    Returns the dates in an inclusive range on which anyone tapped, oldest
+    first. Raises sqlite3.Error if they cannot be read, so a failed read is
+    never taken for a range without taps.
+    """
+    days = []
+    try:
+        for conn, schema, first_day, last_day in _partition_snapshots(start_date, end_date):
+            days.extend(from_day(row[0]) for row in conn.execute(
+                f"SELECT DISTINCT day FROM {schema}.daily_summary WHERE day BETWEEN ? AND ? ORDER BY day",
+                (first_day, last_day)
+            ))
+    except sqlite3.Error as e:
+        print(f"Error retrieving tap days: {e}")
+        raise
+    return days
+
+def get_staff_in_building(query_date):
+    """Returns the names of staff who are clocked in but not out on a given day."""
     conn = get_db_connection()
-    taps = []
     if conn:
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT timestamp FROM tap_events WHERE staff_name = ? AND event_date = ? ORDER BY timestamp ASC",
-                (staff_name, query_date_str)
-            )
-            rows = cursor.fetchall()
-            for row in rows:
-                dt_obj = datetime.strptime(row['timestamp'], "%Y-%m-%d %H:%M:%S")
-                taps.append(dt_obj.strftime("%I:%M:%S %p"))
+            day = to_day(query_date)
+            schema = _partitions.schema_for_day(conn, day)
+            rows = conn.execute(
+                f"SELECT s.name FROM {schema}.daily_summary d JOIN staff s ON s.id = d.staff_id "
+                "WHERE d.day = ? AND d.clocked_out = 0 ORDER BY d.first_in ASC",
+                (day,)
+            ).fetchall()
+            return [row['name'] for row in rows]
         except sqlite3.Error as e:
-            print(f"Error retrieving taps: {e}")
-        finally:
-            conn.close()
-    return taps
+            print(f"Error retrieving staff in building: {e}")
+    return []
 
-# --- NEW STAFF MANAGEMENT FUNCTIONS ---
+# --- PENDING SHEET EXPORTS ---
 
-def add_staff_member(token, name):
-    """Adds a new staff member to the database."""
+def queue_pending_export(query_date, error=None):
+    """Records that a day's sheet could not be saved, counting the attempt. Returns the attempt count."""
+    try:
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO pending_exports (day, attempts, last_error, queued_ts) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET attempts = attempts + 1, last_error = excluded.last_error",
+                (to_day(query_date), error, to_epoch(datetime.now()))
+            )
+            return conn.execute("SELECT attempts FROM pending_exports WHERE day = ?",
+                                (to_day(query_date),)).fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Error queuing pending export: {e}")
+        return None
+
+
+def clear_pending_export(query_date):
+    """Removes a day from the pending exports once its sheet has been saved."""
+    try:
+        with transaction() as conn:
+            conn.execute("DELETE FROM pending_exports WHERE day = ?", (to_day(query_date),))
+        return True
+    except sqlite3.Error as e:
+        print(f"Error clearing pending export: {e}")
+        return False
+
+
+def get_pending_exports():
+    """Returns [(date, attempts)] for the days whose sheet is waiting to be saved, oldest day first."""
     conn = get_db_connection()
     if conn:
         try:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO staff (token, name) VALUES (?, ?)", (token, name))
-            conn.commit()
-            return True
-        except sqlite3.IntegrityError: # Handles duplicate token or name
-            return False
-        finally:
-            conn.close()
+            rows = conn.execute("SELECT day, attempts FROM pending_exports ORDER BY day").fetchall()
+            return [(from_day(row['day']), row['attempts']) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error reading pending exports: {e}")
+    return []
+
+
+# --- NEW STAFF MANAGEMENT FUNCTIONS ---
+
+def add_staff_member(token, name):
+    """Adds a new staff member to the database. Returns their id, or None if the token or name is taken."""
+    try:
+        with transaction() as conn:
+            cursor = conn.execute("INSERT INTO staff (token, name) VALUES (?, ?)", (token, name))
+        return cursor.lastrowid
+    except sqlite3.IntegrityError: # Handles duplicate token or name
+        return None
 
 def get_all_staff():
-    """Retrieves all staff members from the database."""
-    conn = get_db_connection()
+    """Retrieves all active staff members from the database."""
     staff_list = []
+    conn = get_db_connection()
     if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT token, name FROM staff ORDER BY name ASC")
-            rows = cursor.fetchall()
-            for row in rows:
-                staff_list.append({'token': row['token'], 'name': row['name']})
-        finally:
-            conn.close()
+        rows = conn.execute("SELECT id, token, name FROM staff WHERE active = 1 ORDER BY name ASC").fetchall()
+        for row in rows:
+            staff_list.append({'id': row['id'], 'token': row['token'], 'name': row['name']})
     return staff_list
 
-def get_staff_by_token(token):
-    """Retrieves a single staff member by their token."""
+def get_data_version():
+    """
+    Returns PRAGMA data_version for the calling thread's connection. It changes
+    whenever another connection commits to the database.
+    """
     conn = get_db_connection()
     if conn:
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT token, name FROM staff WHERE token = ?", (token,))
-            row = cursor.fetchone()
-            if row:
-                return {'token': row['token'], 'name': row['name']}
-        finally:
-            conn.close()
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error reading data version: {e}")
     return None
 
 
-def update_staff_member(original_token, new_token, new_name):
-    """Updates a staff member's details in the database."""
+def get_staff_revision():
+    """Returns a counter that increases on every change to the staff table."""
     conn = get_db_connection()
     if conn:
         try:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE staff SET token = ?, name = ? WHERE token = ?", (new_token, new_name, original_token))
-            conn.commit()
-            return True
-        except sqlite3.Error:
-            return False
-        finally:
-            conn.close()
+            row = conn.execute("SELECT value FROM change_counters WHERE name = 'staff'").fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Error reading staff revision: {e}")
+    return None
+
+
+def update_staff_member(original_token, new_token, new_name):
+    """
+    Updates a staff member's details in the database. Tap history is keyed on
+    the staff id, so it follows the member through renames and new cards.
+    Returns False if no active staff member holds `original_token`.
+    """
+    try:
+        with transaction() as conn:
+            cursor = conn.execute("UPDATE staff SET token = ?, name = ? WHERE token = ? AND active = 1",
+                                  (new_token, new_name, original_token))
+        return cursor.rowcount > 0
+    except sqlite3.Error:
+        return False
 
 
 def delete_staff_member(token):
-    """Deletes a staff member from the database by their token."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM staff WHERE token = ?", (token,))
-            conn.commit()
-            return True
-        except sqlite3.Error:
-            return False
-        finally:
-            conn.close()
\ No newline at end of file
+    """
+    Removes a staff member from the active roster by their token. The row is
+    kept (inactive) so their tap history remains intact.
+    """
+    try:
+        with transaction() as conn:
+            conn.execute("UPDATE staff SET active = 0 WHERE token = ? AND active = 1", (token,))
+        return True
+    except sqlite3.Error:
+        return False
@@ -0,0 +1,204 @@
+# db_backup.py
+"""
+Online backups of tap_history.db (and any per-year archives).
+
+Backups use sqlite3's online backup API from a connection of their own,
+copying a batch of pages at a time with a pause between batches, so the
+swipe path only ever waits for one short step. Each backup is a timestamped
+folder under BackupDirectory; every copy is checked with PRAGMA quick_check
+before older backups are rotated out.
+
+Command line:
+    python db_backup.py backup
+    python db_backup.py list
+    python db_backup.py verify <backup folder>
+    python db_backup.py restore <backup folder>    (with the app closed)
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from config_manager import load_backup_directory, load_backup_retention, load_backup_interval_hours
+from database_manager import DB_FILE, close_connections, get_partition_files
+
+PAGES_PER_STEP = 256      # ~1 MiB with the default 4 KiB page size
+STEP_PAUSE_SECONDS = 0.05
+FOLDER_FORMAT = '%Y%m%d-%H%M%S'
+
+_backup_lock = threading.Lock()
+
+
+def _copy(source_path, dest_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS):
+    """Copies one database file with the online backup API."""
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages, sleep=pause)
+    finally:
+        dest.close()
+        source.close()
+
+
+def _database_files():
+    """Returns the live database files that make up one backup set."""
+    return [DB_FILE] + get_partition_files()
+
+
+def list_backups(backup_dir=None):
+    """Returns the backup folders, newest first."""
+    backup_dir = backup_dir or load_backup_directory()
+    if not os.path.isdir(backup_dir):
+        return []
+    folders = []
+    for name in os.listdir(backup_dir):
+        try:
+            datetime.strptime(name, FOLDER_FORMAT)
+        except ValueError:
+            continue
+        if os.path.isdir(os.path.join(backup_dir, name)):
+            folders.append(os.path.join(backup_dir, name))
+    return sorted(folders, reverse=True)
+
+
+def verify_backup(folder):
+    """Runs PRAGMA quick_check on every file in a backup folder. Returns True if all pass."""
+    files = [name for name in os.listdir(folder) if name.endswith('.db')] if os.path.isdir(folder) else []
+    if os.path.basename(DB_FILE) not in files:
+        print(f"Backup verification failed: {folder} has no {os.path.basename(DB_FILE)}.")
+        return False
+    for name in files:
+        path = os.path.join(folder, name)
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                result = conn.execute("PRAGMA quick_check").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            result = str(e)
+        if result != 'ok':
+            print(f"Backup verification failed for {path}: {result}")
+            return False
+    return True
+
+
+def rotate_backups(backup_dir=None, keep=None):
+    """Deletes all but the newest `keep` backups. Returns the folders removed."""
+    keep = load_backup_retention() if keep is None else keep
+    removed = []
+    for folder in list_backups(backup_dir)[max(keep, 1):]:
+        try:
+            shutil.rmtree(folder)
+            removed.append(folder)
+        except OSError as e:
+            print(f"Error removing old backup {folder}: {e}")
+    return removed
+
+
+def backup_database(backup_dir=None, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS, rotate=True):
+    """
+    Takes a verified online backup of the database and its archives, then
+    rotates old backups. Returns the new backup folder, or None on failure.
+    """
+    backup_dir = backup_dir or load_backup_directory()
+    folder = os.path.join(backup_dir, datetime.now().strftime(FOLDER_FORMAT))
+    partial = folder + '.partial'
+    try:
+        os.makedirs(partial, exist_ok=True)
+        for path in _database_files():
+            _copy(path, os.path.join(partial, os.path.basename(path)), pages, pause)
+        if not verify_backup(partial):
+            shutil.rmtree(partial, ignore_errors=True)
+            return None
+        os.replace(partial, folder)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error backing up database: {e}")
+        shutil.rmtree(partial, ignore_errors=True)
+        return None
+
+    print(f"Database backed up to {folder}.")
+    if rotate:
+        rotate_backups(backup_dir)
+    return folder
+
+
+def backup_if_due(backup_dir=None):
+    """
+    Takes a backup when the newest one is older than BackupIntervalHours.
+    Returns the new backup folder, or None if none was due (or it failed).
+    """
+    interval = load_backup_interval_hours()
+    if interval <= 0:
+        return None
+    backups = list_backups(backup_dir)
+    if backups:
+        last = datetime.strptime(os.path.basename(backups[0]), FOLDER_FORMAT)
+        if datetime.now() - last < timedelta(hours=interval):
+            return None
+    return backup_database(backup_dir)
+
+
+def start_backup_if_due():
+    """Runs backup_if_due on a background thread, unless a backup is already running."""
+    if not _backup_lock.acquire(blocking=False):
+        return
+
+    def _run():
+        try:
+            backup_if_due()
+        finally:
+            _backup_lock.release()
+
+    threading.Thread(target=_run, name="DatabaseBackup", daemon=True).start()
+
+
+def restore_backup(folder):
+    """
+    Replaces the live database and archives with a verified backup. Run this
+    with the application closed. The current files are backed up first, and
+    archives that are not part of the backup are renamed aside.
+    Returns True on success.
+    """
+    if not verify_backup(folder):
+        return False
+    close_connections()
+    # Not rotated, so the folder being restored cannot be pruned first.
+    if backup_database(rotate=False) is None:
+        print("Restore cancelled: could not back up the current database first.")
+        return False
+
+    restored = {name for name in os.listdir(folder) if name.endswith('.db')}
+    live_dir = os.path.dirname(os.path.abspath(DB_FILE))
+    try:
+        for path in get_partition_files():
+            if os.path.basename(path) not in restored:
+                os.replace(path, path + '.before-restore')
+        for name in sorted(restored):
+            _copy(os.path.join(folder, name), os.path.join(live_dir, name), pages=-1, pause=0)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error restoring backup: {e}")
+        return False
+    print(f"Restored database from {folder}.")
+    return True
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'backup'
+    if command == 'backup':
+        ok = backup_database() is not None
+    elif command == 'list':
+        for folder in list_backups():
+            print(folder)
+        ok = True
+    elif command in ('verify', 'restore') and len(sys.argv) > 2:
+        ok = verify_backup(sys.argv[2]) if command == 'verify' else restore_backup(sys.argv[2])
+        if command == 'verify' and ok:
+            print(f"{sys.argv[2]} is OK.")
+    else:
+        print(__doc__)
+        ok = False
+    close_connections()
+    sys.exit(0 if ok else 1)
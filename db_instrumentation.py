@@ -0,0 +1,219 @@
+# db_instrumentation.py
+"""
+Optional instrumentation for the SQLite connections in database_manager.
+
+When QueryLogging is enabled in config.ini, connections are created with
+InstrumentedConnection, which times every statement (execute plus the fetches
+that drain it) and keeps per-statement call counts, row counts and latency
+histograms. Statements slower than SlowQueryMs are kept in a slow-query log,
+optionally together with their EXPLAIN QUERY PLAN output.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+HISTOGRAM_BOUNDS_MS = (1, 5, 10, 50, 100, 500, 1000)
+SLOW_LOG_SIZE = 200
+
+_PLAN_PREFIXES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+def _normalize(sql):
+    sql = ' '.join(sql.split())
+    # Collapse variable-length IN lists so they share one entry.
+    return re.sub(r'\(\?(?:, ?\?)+\)', '(?, ...)', sql)
+
+
+class QueryStats:
+    """Thread-safe collector for statement timings and the slow-query log."""
+
+    def __init__(self, slow_threshold_ms=50, explain_slow=False):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.explain_slow = explain_slow
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+
+    def record(self, conn, sql, params, elapsed_ms, rows):
+        key = _normalize(sql)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = {
+                    'sql': key, 'calls': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'histogram': [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                }
+            entry['calls'] += 1
+            entry['rows'] += max(rows, 0)
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if elapsed_ms < bound),
+                          len(HISTOGRAM_BOUNDS_MS))
+            entry['histogram'][bucket] += 1
+
+        if elapsed_ms >= self.slow_threshold_ms:
+            plan = self._explain(conn, sql, params) if self.explain_slow else None
+            with self._lock:
+                self._slow.append({
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'sql': key,
+                    'params': repr(params)[:200],
+                    'elapsed_ms': round(elapsed_ms, 3),
+                    'rows': rows,
+                    'plan': plan,
+                })
+
+    @staticmethod
+    def _explain(conn, sql, params):
+        if not sql.lstrip().upper().startswith(_PLAN_PREFIXES):
+            return None
+        try:
+            # Use the base class so the plan query itself is not recorded.
+            rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+            return [row[3] for row in rows]
+        except sqlite3.Error:
+            return None
+
+    def snapshot(self):
+        """Returns per-statement stats, slowest total first."""
+        with self._lock:
+            entries = [dict(entry, histogram=list(entry['histogram'])) for entry in self._stats.values()]
+        for entry in entries:
+            entry['avg_ms'] = entry['total_ms'] / entry['calls'] if entry['calls'] else 0.0
+        return sorted(entries, key=lambda entry: entry['total_ms'], reverse=True)
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+
+    def dump(self, path):
+        """Writes the stats and the slow-query log to a JSON file."""
+        data = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'histogram_bounds_ms': list(HISTOGRAM_BOUNDS_MS),
+            'statements': self.snapshot(),
+            'slow_queries': self.slow_queries(),
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that reports each statement to the connection's QueryStats once
+    it has been drained (or replaced by the next statement).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None
+
+    def _begin(self, sql, params):
+        self._finish()
+        self._pending = [sql, params, 0.0, 0]  # sql, params, elapsed ms, rows
+
+    def _add(self, started, rows=0):
+        if self._pending is not None:
+            self._pending[2] += (time.perf_counter() - started) * 1000
+            self._pending[3] += rows
+
+    def _finish(self):
+        if self._pending is not None:
+            sql, params, elapsed_ms, rows = self._pending
+            self._pending = None
+            self.connection.stats.record(self.connection, sql, params, elapsed_ms, rows)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self._add(started)
+        if self.description is None:  # DML/DDL: nothing left to fetch
+            self._pending[3] = self.rowcount
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, None)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self._add(started)
+        self._pending[3] = self.rowcount
+        self._finish()
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, 1 if row is not None else 0)
+        self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(started, len(rows))
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started)
+            self._finish()
+            raise
+        self._add(started, 1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose statements are timed into `stats`."""
+    stats = None  # set by make_connection_factory()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        # With WAL and synchronous=FULL the fsync happens here, so time it too.
+        started = time.perf_counter()
+        super().commit()
+        self.stats.record(self, "COMMIT", None, (time.perf_counter() - started) * 1000, 0)
+
+
+def make_connection_factory(stats):
+    """Returns an InstrumentedConnection subclass bound to a QueryStats collector."""
+    return type('BoundInstrumentedConnection', (InstrumentedConnection,), {'stats': stats})
@@ -0,0 +1,154 @@
+# db_maintenance.py
+"""
+Idle-time maintenance for tap_history.db.
+
+A maintenance pass refreshes planner statistics (PRAGMA optimize, or ANALYZE
+on a database that has never been analyzed), returns free pages to the OS
+with PRAGMA incremental_vacuum, and truncates the WAL. The pass is split into
+small slices that run one at a time on the database worker, and only while
+no cards have been swiped for MaintenanceIdleSeconds, so it never competes
+with the swipe path. File sizes before and after each pass are reported.
+"""
+import os
+import sqlite3
+import time
+
+from PySide6.QtCore import QObject, Signal, QTimer
+
+from config_manager import load_maintenance_interval_hours, load_maintenance_idle_seconds
+from database_manager import DB_FILE, get_db_connection, transaction, checkpoint, get_partition_files
+from db_worker import get_db_worker
+
+VACUUM_PAGES_PER_SLICE = 256
+ANALYSIS_LIMIT = 400  # rows sampled per index by ANALYZE / PRAGMA optimize
+
+
+def database_file_sizes():
+    """Returns {path: bytes} for the database, its WAL and the per-year archives."""
+    sizes = {}
+    for path in [DB_FILE, DB_FILE + '-wal'] + get_partition_files():
+        if os.path.exists(path):
+            sizes[path] = os.path.getsize(path)
+    return sizes
+
+
+def maintenance_slices(pages_per_slice=VACUUM_PAGES_PER_SLICE):
+    """
+    Generator running one maintenance pass; each next() does one bounded
+    slice of work and yields its description. The last value yielded is the
+    report: {'before': sizes, 'after': sizes, 'freed_pages': n}.
+    """
+    before = database_file_sizes()
+    freed_pages = 0
+    conn = get_db_connection()
+    if conn is None:
+        return
+
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            conn.execute("PRAGMA optimize")
+            yield "optimize"
+        else:
+            conn.execute("ANALYZE")
+            yield "analyze"
+
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            while free > 0:
+                # incremental_vacuum frees one page per sqlite3_step and Python's
+                # sqlite3 steps a row-less statement only once, so free page by page
+                # inside one transaction.
+                with transaction() as conn:
+                    for _ in range(min(free, pages_per_slice)):
+                        conn.execute("PRAGMA incremental_vacuum(1)")
+                remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if remaining >= free:
+                    break
+                freed_pages += free - remaining
+                free = remaining
+                yield f"incremental_vacuum ({remaining} free pages left)"
+    except sqlite3.Error as e:
+        print(f"Error during database maintenance: {e}")
+
+    checkpoint('TRUNCATE')
+    yield {'before': before, 'after': database_file_sizes(), 'freed_pages': freed_pages}
+
+
+def format_size_report(report):
+    """Returns a one-line summary of a maintenance report."""
+    before = sum(report['before'].values())
+    after = sum(report['after'].values())
+    return (f"Database maintenance: {before / 1024:.0f} KB -> {after / 1024:.0f} KB "
+            f"({report['freed_pages']} pages reclaimed).")
+
+
+class MaintenanceScheduler(QObject):
+    """
+    Runs a maintenance pass every MaintenanceIntervalHours, one slice per
+    timer tick on the database worker, pausing whenever there was recent
+    activity (see note_activity).
+    """
+    finished = Signal(dict)  # the size report
+
+    TICK_MS = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._worker = get_db_worker()
+        self._interval = load_maintenance_interval_hours() * 3600
+        self._idle_seconds = load_maintenance_idle_seconds()
+        self._last_activity = time.monotonic()
+        self._last_run = None
+        self._slices = None
+        self._slice_pending = False
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.TICK_MS)
+        self._timer.timeout.connect(self._tick)
+        if self._interval > 0:
+            self._timer.start()
+
+    def note_activity(self):
+        """Postpones maintenance slices until the app has been idle again."""
+        self._last_activity = time.monotonic()
+
+    def _tick(self):
+        if self._slice_pending:
+            return
+        now = time.monotonic()
+        if now - self._last_activity < self._idle_seconds:
+            return
+        if self._slices is None:
+            if self._last_run is not None and now - self._last_run < self._interval:
+                return
+            self._slices = maintenance_slices()
+        self._slice_pending = True
+        self._worker.call(next, self._slices, None, on_result=self._on_slice, on_error=self._on_error)
+
+    def _on_slice(self, result):
+        self._slice_pending = False
+        if isinstance(result, str):
+            return
+        self._slices = None
+        self._last_run = time.monotonic()
+        if result:
+            print(format_size_report(result))
+            self.finished.emit(result)
+
+    def _on_error(self, error):
+        print(f"Error during database maintenance: {error}")
+        self._slice_pending = False
+        self._slices = None
+        self._last_run = time.monotonic()
+
+
+_scheduler = None
+
+
+def get_maintenance_scheduler():
+    """Returns the application-wide MaintenanceScheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaintenanceScheduler()
+    return _scheduler
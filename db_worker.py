@@ -0,0 +1,89 @@
+# db_worker.py
+import asyncio
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+
+from database_manager import close_connections
+from result_bridge import ResultBridge
+from tap_writer import shutdown_tap_writer
+
+
+class DatabaseWorker(threading.Thread):
+    """
+    An actor thread that owns its own database connection and runs database
+    calls one at a time, in submission order. The GUI submits work and gets
+    the result back as a Future, an awaitable, or a Qt-delivered callback, so
+    a slow disk or a locked database never blocks the window.
+    """
+    _STOP = object()
+
+    def __init__(self):
+        super().__init__(name="DatabaseWorker", daemon=True)
+        self._queue = queue.Queue()
+        self._bridge = ResultBridge("Database job")
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                traceback.print_exc()
+                future.set_exception(e)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) on the worker and returns a concurrent.futures.Future."""
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def submit_async(self, fn, *args, **kwargs):
+        """Like submit(), but returns an asyncio future for use with `await`."""
+        return asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def call(self, fn, *args, on_result=None, on_error=None, **kwargs):
+        """
+        Queues fn on the worker and calls on_result(result) or on_error(exception)
+        in the GUI thread once it finishes. Returns the Future.
+        """
+        return self.deliver(self.submit(fn, *args, **kwargs), on_result, on_error)
+
+    def deliver(self, future, on_result=None, on_error=None):
+        """
+        Calls on_result(result) or on_error(exception) in the GUI thread once
+        any concurrent.futures.Future finishes. Returns the Future.
+        """
+        return self._bridge.deliver(future, on_result, on_error)
+
+    def stop(self, timeout=5.0):
+        """Lets the queued jobs finish, then stops the thread."""
+        if self.is_alive():
+            self._queue.put(self._STOP)
+            self.join(timeout)
+
+
+_worker = None
+
+
+def get_db_worker():
+    """Returns the application-wide DatabaseWorker, starting it on first use (from the GUI thread)."""
+    global _worker
+    if _worker is None:
+        _worker = DatabaseWorker()
+        _worker.start()
+    return _worker
+
+
+def shutdown_db_worker():
+    """Shutdown hook: flushes pending taps, drains the worker, then closes every pooled connection."""
+    shutdown_tap_writer()
+    if _worker is not None:
+        _worker.stop()
+    close_connections()
@@ -0,0 +1,195 @@
+# job_executor.py
+"""
+A shared background executor for blocking file and report work.
+
+Jobs run on a small pool of threads, highest priority first and in
+submission order within a priority. Jobs that share a key (usually a file
+path) never run at the same time; they run one after another in the order
+they were submitted, so a load never overlaps a save of the same sheet.
+Each job returns a concurrent.futures.Future. A queued job can be cancelled
+outright; a running one is asked to stop through its JobContext. Results,
+errors and progress reports are delivered in the GUI thread through Qt
+signals.
+"""
+import inspect
+import itertools
+import queue
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import Future, CancelledError
+
+from PySide6.QtCore import Signal, QCoreApplication
+
+from result_bridge import ResultBridge
+
+PRIORITY_HIGH = 0    # the user is waiting for it
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2     # background upkeep
+
+DEFAULT_WORKERS = 2
+
+
+class JobContext:
+    """Handed to jobs that take a `job` argument, for progress reports and cancellation checks."""
+
+    def __init__(self, executor, name):
+        self._executor = executor
+        self.name = name
+        self._cancel = threading.Event()
+
+    def cancelled(self):
+        """True once the job has been asked to stop; long jobs should check this between steps."""
+        return self._cancel.is_set()
+
+    def report(self, done, total):
+        """Emits JobExecutor.progress(name, done, total) in the GUI thread."""
+        self._executor.bridge.progress.emit(self.name, done, total)
+
+
+class _JobBridge(ResultBridge):
+    """A ResultBridge that also carries progress reports from the pool threads."""
+    progress = Signal(str, int, int)  # job name, done, total
+
+
+class JobExecutor:
+    """A priority thread pool with per-key serialization and GUI-thread delivery."""
+    _STOP = object()
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.bridge = _JobBridge("Background job")
+        app = QCoreApplication.instance()
+        if app is not None:
+            self.bridge.moveToThread(app.thread())
+        self.progress = self.bridge.progress
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._busy_keys = set()
+        self._waiting = {}  # key -> deque of jobs queued behind the running one
+        self._contexts = {}  # future -> JobContext, while the job is pending or running
+        self._threads = [threading.Thread(target=self._run, name=f"JobExecutor-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority=PRIORITY_NORMAL, key=None, name=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns a Future. If fn has a `job`
+        parameter it receives a JobContext. Jobs with the same `key` run one
+        at a time, in submission order.
+        """
+        future = Future()
+        context = JobContext(self, name or getattr(fn, '__name__', 'job'))
+        try:
+            if 'job' in inspect.signature(fn).parameters:
+                kwargs['job'] = context
+        except (TypeError, ValueError):
+            pass
+        with self._lock:
+            self._contexts[future] = context
+        future.add_done_callback(self._forget)
+        self._queue.put((priority, next(self._sequence), (future, key, fn, args, kwargs)))
+        return future
+
+    def call(self, fn, *args, on_result=None, on_error=None, priority=PRIORITY_NORMAL, key=None, name=None,
+             **kwargs):
+        """
+        Queues fn and calls on_result(result) or on_error(exception) in the GUI
+        thread once it finishes. Nothing is delivered for a cancelled job.
+        Returns the Future.
+        """
+        future = self.submit(fn, *args, priority=priority, key=key, name=name, **kwargs)
+        return self.deliver(future, on_result, on_error)
+
+    def deliver(self, future, on_result=None, on_error=None):
+        """Calls on_result or on_error in the GUI thread once `future` finishes. Returns the Future."""
+        return self.bridge.deliver(future, on_result, on_error)
+
+    def cancel(self, future):
+        """Cancels a queued job, or asks a running one to stop. Returns False if it had already finished."""
+        with self._lock:
+            context = self._contexts.get(future)
+        if context is None:
+            return False
+        context._cancel.set()
+        future.cancel()
+        return True
+
+    def _forget(self, future):
+        with self._lock:
+            self._contexts.pop(future, None)
+
+    def _run(self):
+        while True:
+            _, _, item = self._queue.get()
+            if item is self._STOP:
+                return
+            key = item[1]
+            if key is not None:
+                with self._lock:
+                    if key in self._busy_keys:
+                        self._waiting.setdefault(key, deque()).append(item)
+                        continue
+                    self._busy_keys.add(key)
+            # Jobs queued behind this one for the same key run next on this thread.
+            while item is not None:
+                future, key, fn, args, kwargs = item
+                self._execute(future, fn, args, kwargs)
+                item = self._next_for_key(key) if key is not None else None
+
+    def _execute(self, future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        context = kwargs.get('job')
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            if not isinstance(e, CancelledError):
+                traceback.print_exc()
+            future.set_exception(e)
+            return
+        if context is not None and context.cancelled():
+            future.set_exception(CancelledError())
+        else:
+            future.set_result(result)
+
+    def _next_for_key(self, key):
+        """Returns the next job waiting for `key`, or releases the key and returns None."""
+        with self._lock:
+            waiting = self._waiting.get(key)
+            if waiting:
+                item = waiting.popleft()
+                if not waiting:
+                    del self._waiting[key]
+                return item
+            self._busy_keys.discard(key)
+            return None
+
+    def shutdown(self, timeout=30.0):
+        """Lets the queued jobs finish, then stops the pool threads."""
+        for _ in self._threads:
+            self._queue.put((PRIORITY_LOW + 1, next(self._sequence), self._STOP))
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor():
+    """Returns the application-wide JobExecutor, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor()
+        return _executor
+
+
+def shutdown_job_executor():
+    """Shutdown hook: finishes the queued jobs and stops the pool, if it was started."""
+    if _executor is not None:
+        _executor.shutdown()
@@ -1,7 +1,7 @@
 import sys
 import os
 from PySide6.QtCore import (
-    Qt, QPropertyAnimation, QEasingCurve, Slot, QVariantAnimation, QEvent, QSize, Signal
+    Qt, QPropertyAnimation, QEasingCurve, Slot, QVariantAnimation, QEvent, QSize, Signal, QTimer
 )
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -17,11 +17,20 @@ from settings import SettingsPage
 from system_tray import SystemTrayIcon
 from config_manager import load_title, load_admin_mode, load_nav_slider_enabled, load_logo_path
 from system_toast import SystemToast
+from database_manager import create_tables, archive_closed_years, setup_query_instrumentation
+from db_worker import shutdown_db_worker
+from tap_writer import shutdown_tap_writer
+from sheet_export import shutdown_exports
+from job_executor import shutdown_job_executor
+from db_backup import start_backup_if_due
+from db_maintenance import get_maintenance_scheduler, format_size_report
 
 
 class DatabaseSetup:
     def setup_database(self):
-        print("Mock database complete.")
+        setup_query_instrumentation()
+        create_tables()
+        archive_closed_years()
 
 
 database_setup = DatabaseSetup()
@@ -250,7 +259,6 @@ class MainWindow(QMainWindow):
             if self.stacked_content_area.indexOf(page_widget) == -1:
                 self.stacked_content_area.addWidget(page_widget)
 
-        self.members_page.staff_data_changed.connect(self.dashboard_page.load_staff_data)
         self.nav_drawer.logout_requested.connect(self.confirm_logout)
 
         self.content_pane_layout.addWidget(self.stacked_content_area, 1)
@@ -266,6 +274,16 @@ class MainWindow(QMainWindow):
         self.nav_drawer.set_logo(load_logo_path())
         self.tray_icon.show_notification("Application Started", "The sign-in system is now running.")
 
+        # Online database backups run in the background whenever one is due.
+        self.backup_timer = QTimer(self)
+        self.backup_timer.setInterval(60 * 60 * 1000)
+        self.backup_timer.timeout.connect(start_backup_if_due)
+        self.backup_timer.start()
+        start_backup_if_due()
+
+        get_maintenance_scheduler().finished.connect(
+            lambda report: self.show_status_message(format_size_report(report), 10000))
+
     def setup_tray_icon(self):
         icon_path = "icons/app_icon.ico"
         self.tray_icon = SystemTrayIcon(icon_path, self)
@@ -337,6 +355,11 @@ if __name__ == "__main__":
     database_setup.setup_database()
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
+    # Taps are committed before the last sheets are written, so the exports include them.
+    app.aboutToQuit.connect(shutdown_tap_writer)
+    app.aboutToQuit.connect(shutdown_exports)
+    app.aboutToQuit.connect(shutdown_job_executor)
+    app.aboutToQuit.connect(shutdown_db_worker)
 
     # Set the application icon for the title bar
     app.setWindowIcon(QIcon("icons/app_icon.png"))
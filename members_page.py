@@ -1,7 +1,7 @@
 import os
 import csv
 from functools import partial
-from PySide6.QtCore import Qt, Signal, QSize
+from PySide6.QtCore import Qt, QSize
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit,
     QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
@@ -12,10 +12,7 @@ from PySide6.QtGui import QFont, QIcon, QAction
 
 import constants as c
 from config_manager import load_admin_mode
-# --- MODIFICATION: Import database functions ---
-from database_manager import (
-    get_all_staff, add_staff_member, update_staff_member, delete_staff_member, get_staff_by_token
-)
+from staff_directory import get_staff_directory
 
 
 class MemberDialog(QDialog):
@@ -63,11 +60,16 @@ class MemberDialog(QDialog):
 
 class MembersPage(QWidget):
     """The main settings page, featuring the member management section."""
-    staff_data_changed = Signal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_window = parent
+        self.is_admin_mode_unlocked = load_admin_mode()
+        self.staff_directory = get_staff_directory()
+        self.staff_directory.member_added.connect(self._on_member_added)
+        self.staff_directory.member_updated.connect(self._on_member_updated)
+        self.staff_directory.member_removed.connect(self._on_member_removed)
+        self.staff_directory.reloaded.connect(self.load_members_data)
         # self.staff_file = 'staff_data.csv' # No longer needed
 
         main_layout = QVBoxLayout(self)
@@ -189,49 +191,85 @@ class MembersPage(QWidget):
         self.load_members_data()
 
     def load_members_data(self):
-        """Reads staff data from the database and populates the table."""
-        is_admin_mode_unlocked = load_admin_mode()
+        """Populates the table from the shared staff directory."""
+        self.members_table.setSortingEnabled(False)
         self.members_table.setRowCount(0)
+        for member in self.staff_directory.all():
+            self._insert_member_row(member)
+        self.members_table.setSortingEnabled(True)
+        self.filter_table()
+
+    def _insert_member_row(self, member):
+        row = self.members_table.rowCount()
+        self.members_table.insertRow(row)
+
+        # Columns are now Name, Token
+        name_item = QTableWidgetItem(member['name'])
+        token_item = QTableWidgetItem(str(member['token']))
+
+        # Store the token in the item for later retrieval
+        token_item.setData(Qt.ItemDataRole.UserRole, member['token'])
+
+        self.members_table.setItem(row, 0, name_item)
+        self.members_table.setItem(row, 1, token_item)
+        self.members_table.setCellWidget(row, 2, self._create_actions_widget(member['token']))
+
+    def _create_actions_widget(self, token):
+        actions_widget = QWidget()
+        actions_layout = QHBoxLayout(actions_widget)
+        actions_layout.setContentsMargins(5, 0, 5, 0)
+        actions_layout.setSpacing(10)
+
+        edit_button = QToolButton()
+        edit_button.setIcon(QIcon("icons/edit_icon.svg"))
+        edit_button.setToolTip("Edit Member")
+        edit_button.setCursor(Qt.PointingHandCursor)
+        edit_button.setStyleSheet("QToolButton { border: none; }")
+        edit_button.clicked.connect(partial(self.edit_member, token))
+
+        delete_button = QToolButton()
+        delete_button.setIcon(QIcon("icons/close_icon.svg"))
+        delete_button.setToolTip("Delete Member")
+        delete_button.setCursor(Qt.PointingHandCursor)
+        delete_button.setStyleSheet("QToolButton { border: none; }")
+        delete_button.clicked.connect(partial(self.delete_member, token))
+
+        actions_layout.addWidget(edit_button)
+        actions_layout.addWidget(delete_button)
+        actions_widget.setEnabled(self.is_admin_mode_unlocked)
+        return actions_widget
+
+    def _find_row(self, token):
+        for row in range(self.members_table.rowCount()):
+            token_item = self.members_table.item(row, 1)
+            if token_item and token_item.data(Qt.ItemDataRole.UserRole) == token:
+                return row
+        return -1
 
-        staff_list = get_all_staff()
-
-        for member in staff_list:
-            row = self.members_table.rowCount()
-            self.members_table.insertRow(row)
-
-            # Columns are now Name, Token
-            name_item = QTableWidgetItem(member['name'])
-            token_item = QTableWidgetItem(str(member['token']))
-
-            # Store the token in the item for later retrieval
-            token_item.setData(Qt.ItemDataRole.UserRole, member['token'])
-
-            self.members_table.setItem(row, 0, name_item)
-            self.members_table.setItem(row, 1, token_item)
-
-            actions_widget = QWidget()
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(5, 0, 5, 0)
-            actions_layout.setSpacing(10)
-
-            edit_button = QToolButton()
-            edit_button.setIcon(QIcon("icons/edit_icon.svg"))
-            edit_button.setToolTip("Edit Member")
-            edit_button.setCursor(Qt.PointingHandCursor)
-            edit_button.setStyleSheet("QToolButton { border: none; }")
-            edit_button.clicked.connect(partial(self.edit_member, row))
-
-            delete_button = QToolButton()
-            delete_button.setIcon(QIcon("icons/close_icon.svg"))
-            delete_button.setToolTip("Delete Member")
-            delete_button.setCursor(Qt.PointingHandCursor)
-            delete_button.setStyleSheet("QToolButton { border: none; }")
-            delete_button.clicked.connect(partial(self.delete_member, row))
+    def _on_member_added(self, member):
+        self.members_table.setSortingEnabled(False)
+        self._insert_member_row(member)
+        self.members_table.setSortingEnabled(True)
+        self.filter_table()
+
+    def _on_member_updated(self, original_token, member):
+        row = self._find_row(original_token)
+        if row == -1:
+            self._on_member_added(member)
+            return
+        self.members_table.setSortingEnabled(False)
+        self.members_table.item(row, 0).setText(member['name'])
+        token_item = self.members_table.item(row, 1)
+        token_item.setText(str(member['token']))
+        token_item.setData(Qt.ItemDataRole.UserRole, member['token'])
+        self.members_table.setCellWidget(row, 2, self._create_actions_widget(member['token']))
+        self.members_table.setSortingEnabled(True)
+        self.filter_table()
 
-            actions_layout.addWidget(edit_button)
-            actions_layout.addWidget(delete_button)
-            self.members_table.setCellWidget(row, 2, actions_widget)
-            actions_widget.setEnabled(is_admin_mode_unlocked)
+    def _on_member_removed(self, member):
+        row = self._find_row(member['token'])
+        if row != -1:
+            self.members_table.removeRow(row)
 
     def filter_table(self):
         """Hides rows that don't match the search text."""
@@ -253,24 +291,25 @@ class MembersPage(QWidget):
                 token = data["token"]
                 name = data["name"]
 
-                # Check if token already exists in the database
-                if get_staff_by_token(token):
+                # Check if token already exists in the roster
+                if token in self.staff_directory:
                     QMessageBox.warning(self, "Duplicate Token", "This token number is already registered.")
                     return
 
-                if add_staff_member(token, name):
-                    QMessageBox.information(self, "Success", f"Member '{name}' added successfully.")
-                    self.load_members_data()
-                    self.staff_data_changed.emit()
-                else:
-                    QMessageBox.critical(self, "Database Error",
-                                         "Could not add the new member due to a database error.")
+                def on_done(ok):
+                    if ok:
+                        QMessageBox.information(self, "Success", f"Member '{name}' added successfully.")
+                    else:
+                        QMessageBox.critical(self, "Database Error",
+                                             "Could not add the new member due to a database error.")
+
+                self.staff_directory.add(token, name, on_done=on_done)
 
-    def edit_member(self, row):
+    def edit_member(self, original_token):
         """Opens a dialog to edit an existing member."""
-        name = self.members_table.item(row, 0).text()
-        token_item = self.members_table.item(row, 1)
-        original_token = token_item.data(Qt.ItemDataRole.UserRole)
+        name = self.staff_directory.name_for(original_token)
+        if name is None:
+            return
 
         dialog = MemberDialog("Edit Member", self)
         dialog.name_input.setText(name)
@@ -283,36 +322,39 @@ class MembersPage(QWidget):
                 new_name = data["name"]
 
                 # If token is changed, check if the new one is a duplicate
-                if new_token != original_token and get_staff_by_token(new_token):
+                if new_token != original_token and new_token in self.staff_directory:
                     QMessageBox.warning(self, "Duplicate Token",
                                         "The new token number is already registered to another member.")
                     return
 
-                if update_staff_member(original_token, new_token, new_name):
-                    QMessageBox.information(self, "Success", "Member details updated successfully.")
-                    self.load_members_data()
-                    self.staff_data_changed.emit()
-                else:
-                    QMessageBox.critical(self, "Database Error", "Could not update member details.")
+                def on_done(ok):
+                    if ok:
+                        QMessageBox.information(self, "Success", "Member details updated successfully.")
+                    else:
+                        QMessageBox.critical(self, "Database Error", "Could not update member details.")
+
+                self.staff_directory.update(original_token, new_token, new_name, on_done=on_done)
 
-    def delete_member(self, row):
+    def delete_member(self, token):
         """Deletes a member after confirmation."""
-        name = self.members_table.item(row, 0).text()
-        token_item = self.members_table.item(row, 1)
-        token = token_item.data(Qt.ItemDataRole.UserRole)
+        name = self.staff_directory.name_for(token)
+        if name is None:
+            return
 
         reply = QMessageBox.question(self, "Confirm Delete", f"Are you sure you want to delete {name}?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            if delete_staff_member(token):
-                QMessageBox.information(self, "Success", f"Member '{name}' deleted.")
-                self.load_members_data()
-                self.staff_data_changed.emit()
-            else:
-                QMessageBox.critical(self, "Database Error", "Could not delete the member.")
+            def on_done(ok):
+                if ok:
+                    QMessageBox.information(self, "Success", f"Member '{name}' deleted.")
+                else:
+                    QMessageBox.critical(self, "Database Error", "Could not delete the member.")
+
+            self.staff_directory.remove(token, on_done=on_done)
 
     def update_admin_mode_ui(self, is_unlocked):
         """Enables or disables member controls based on admin mode."""
+        self.is_admin_mode_unlocked = is_unlocked
         self.add_member_button.setEnabled(is_unlocked)
         for row in range(self.members_table.rowCount()):
             widget = self.members_table.cellWidget(row, 2)
@@ -1,77 +1,107 @@
 import csv
 import os
+import sqlite3
 import sys
-from database_manager import create_tables, add_staff_member, get_db_connection
+from database_manager import create_tables, get_db_connection, transaction, close_connections
 
 STAFF_FILE = 'staff_data.csv'
 
 
+def _upsert_by_token(conn, token, name):
+    """
+    Updates (and reactivates) the staff row for `token`, or adds one.
+    Existing rows keep their id, so their tap history stays attached.
+    Returns 'added' or 'updated'.
+    """
+    row = conn.execute("SELECT id FROM staff WHERE token = ? ORDER BY active DESC, id DESC LIMIT 1",
+                       (token,)).fetchone()
+    if row is None:
+        conn.execute("INSERT INTO staff (token, name) VALUES (?, ?)", (token, name))
+        return 'added'
+    conn.execute("UPDATE staff SET name = ?, active = 1 WHERE id = ?", (name, row['id']))
+    return 'updated'
+
+
 def migrate():
     """
     Reads staff data from staff_data.csv and inserts it into the SQLite database.
+    Running it again makes the active roster match the file: staff are matched
+    by token and updated in place, and staff missing from the file are
+    deactivated. Tap history is never removed.
     """
     # 1. Ensure the database and tables exist
     print("Initializing database and tables...")
     create_tables()
 
-    # 2. Check if the staff table is already populated
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM staff")
-        count = cursor.fetchone()[0]
-        conn.close()
-        if count > 0:
-            print("Staff table is not empty. Migration has likely already been run.")
-            # Ask user if they want to proceed
-            response = input("Do you want to clear the table and migrate again? THIS IS DESTRUCTIVE. (yes/no): ")
-            if response.lower() != 'yes':
-                print("Migration cancelled.")
-                return
-            else:
-                # Clear the table
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM staff")
-                conn.commit()
-                conn.close()
-                print("Staff table cleared.")
-
-    # 3. Check if the CSV file exists
+    # 2. Check if the CSV file exists
     if not os.path.exists(STAFF_FILE):
         print(f"'{STAFF_FILE}' not found. No data to migrate.")
         return
 
-    # 4. Read the CSV and insert into the database
+    # 3. Read the CSV
     print(f"Reading data from '{STAFF_FILE}'...")
+    staff_rows = []
+    skipped_count = 0
     try:
         with open(STAFF_FILE, 'r', newline='') as f:
             reader = csv.reader(f)
             header = next(reader)  # Skip header
-
-            migrated_count = 0
-            skipped_count = 0
-
             for row in reader:
                 if not row: continue
                 try:
-                    token = int(row[0])
-                    name = row[1]
-                    if add_staff_member(token, name):
+                    staff_rows.append((int(row[0]), row[1]))
+                except (ValueError, IndexError):
+                    print(f"  Skipped invalid row: {row}")
+                    skipped_count += 1
+    except Exception as e:
+        print(f"An error occurred during migration: {e}")
+        return
+    if not staff_rows:
+        print(f"No staff found in '{STAFF_FILE}'. Nothing to migrate.")
+        return
+
+    # 4. Check if the staff table is already populated
+    conn = get_db_connection()
+    if conn:
+        count = conn.execute("SELECT COUNT(*) FROM staff WHERE active = 1").fetchone()[0]
+        if count > 0:
+            print("Staff table is not empty. Migration has likely already been run.")
+            # Ask user if they want to proceed
+            response = input("Do you want to replace the roster with the file? Staff not in the file are "
+                             "deactivated; tap history is kept. (yes/no): ")
+            if response.lower() != 'yes':
+                print("Migration cancelled.")
+                return
+
+    # 5. Update the roster in one transaction, matching staff by token
+    migrated_count = 0
+    updated_count = 0
+    try:
+        with transaction() as conn:
+            tokens = [token for token, _ in staff_rows]
+            conn.execute(
+                f"UPDATE staff SET active = 0 WHERE active = 1 AND token NOT IN ({', '.join('?' * len(tokens))})",
+                tokens
+            )
+            for token, name in staff_rows:
+                try:
+                    if _upsert_by_token(conn, token, name) == 'added':
                         print(f"  Migrated: {name} (Token: {token})")
                         migrated_count += 1
                     else:
-                        print(f"  Skipped (already exists?): {name} (Token: {token})")
-                        skipped_count += 1
-                except (ValueError, IndexError):
-                    print(f"  Skipped invalid row: {row}")
+                        print(f"  Updated: {name} (Token: {token})")
+                        updated_count += 1
+                except sqlite3.IntegrityError:
+                    print(f"  Skipped (name already in use?): {name} (Token: {token})")
                     skipped_count += 1
 
-        print(f"\nMigration complete. {migrated_count} records migrated, {skipped_count} records skipped.")
+        print(f"\nMigration complete. {migrated_count} records migrated, {updated_count} updated, "
+              f"{skipped_count} records skipped.")
 
-    except Exception as e:
+    except sqlite3.Error as e:
         print(f"An error occurred during migration: {e}")
 
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    migrate()
+    close_connections()
\ No newline at end of file
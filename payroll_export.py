@@ -0,0 +1,153 @@
+# payroll_export.py
+"""
+Streaming exports of tap history for payroll.
+
+Two kinds of record can be exported for a date range:
+    events  one row per tap: date, staff name, token, time and how it was
+            made (swipe, manual_in, manual_out)
+    pairs   clock-in/clock-out pairs derived from each staff member's taps
+            per day (1st-2nd, 3rd-4th, ...), with the hours in between; a
+            final tap without a partner is an open pair
+
+Rows are read from the database cursor and written as they arrive, so
+memory use stays flat however long the range is. The output format follows
+the file extension: .csv, .jsonl or .xlsx (openpyxl write_only mode). Add
+.gz to a CSV or JSON Lines file name to gzip it. Dates and times are written
+as 'YYYY-MM-DD' and 'YYYY-MM-DD HH:MM:SS' (native date cells in xlsx).
+
+Command line:
+    python payroll_export.py events|pairs <start YYYY-MM-DD> <end YYYY-MM-DD> <output file>
+"""
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+from datetime import date
+from itertools import groupby
+
+from openpyxl import Workbook
+
+from database_manager import iter_tap_events, close_connections
+
+EVENT_COLUMNS = ["date", "staff_name", "token", "time", "kind"]
+PAIR_COLUMNS = ["date", "staff_name", "token", "clock_in", "clock_out", "hours", "in_kind", "out_kind"]
+XLSX_MAX_ROWS = 1048576  # Excel's row limit; longer exports continue on another sheet
+
+
+def iter_event_rows(start_date, end_date):
+    """Yields one row per tap, in EVENT_COLUMNS order."""
+    for day, _, name, token, when, kind in iter_tap_events(start_date, end_date):
+        yield day, name, token, when, kind
+
+
+def iter_pair_rows(start_date, end_date):
+    """Yields one clock-in/clock-out pair per row, in PAIR_COLUMNS order."""
+    events = iter_tap_events(start_date, end_date)
+    for (day, _), taps in groupby(events, key=lambda event: (event[0], event[1])):
+        taps = iter(taps)
+        for tap_in in taps:
+            tap_out = next(taps, None)
+            _, _, name, token, clock_in, in_kind = tap_in
+            if tap_out is None:
+                yield day, name, token, clock_in, None, None, in_kind, None
+            else:
+                clock_out, out_kind = tap_out[4], tap_out[5]
+                hours = round((clock_out - clock_in).total_seconds() / 3600, 2)
+                yield day, name, token, clock_in, clock_out, hours, in_kind, out_kind
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+def _write_csv(path, columns, rows):
+    count = 0
+    with _open_text(path) as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        # csv writes None as an empty field and dates as 'YYYY-MM-DD[ HH:MM:SS]'.
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _write_jsonl(path, columns, rows):
+    count = 0
+    with _open_text(path) as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), default=str))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def _write_xlsx(path, columns, rows, title):
+    # write_only streams rows into the sheet XML instead of building cells in memory.
+    wb = Workbook(write_only=True)
+    count = 0
+    sheet_rows = XLSX_MAX_ROWS
+    sheets = 0
+    for row in rows:
+        if sheet_rows == XLSX_MAX_ROWS:
+            sheets += 1
+            ws = wb.create_sheet(title if sheets == 1 else f"{title} {sheets}")
+            ws.append(columns)
+            sheet_rows = 1
+        ws.append(list(row))
+        sheet_rows += 1
+        count += 1
+    if sheets == 0:
+        wb.create_sheet(title).append(columns)
+    wb.save(path)
+    return count
+
+
+def export_tap_history(path, start_date, end_date, record='events'):
+    """
+    Streams the taps ('events') or clock-in/out pairs ('pairs') for an
+    inclusive date range to `path`, in the format given by its extension.
+    Returns the number of rows written, or None if the export failed, in
+    which case no partial file is left behind.
+    """
+    if record == 'events':
+        columns, rows, title = EVENT_COLUMNS, iter_event_rows(start_date, end_date), "Tap Events"
+    elif record == 'pairs':
+        columns, rows, title = PAIR_COLUMNS, iter_pair_rows(start_date, end_date), "Clock Pairs"
+    else:
+        raise ValueError(f"Unknown record type {record!r}; expected 'events' or 'pairs'.")
+
+    name = path[:-3] if path.endswith('.gz') else path
+    try:
+        if name.endswith('.csv'):
+            return _write_csv(path, columns, rows)
+        if name.endswith('.jsonl'):
+            return _write_jsonl(path, columns, rows)
+        if name.endswith('.xlsx') and name == path:
+            return _write_xlsx(path, columns, rows, title)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error exporting tap history to '{path}': {e}")
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    raise ValueError(f"Unsupported export file '{path}'; use .csv, .jsonl (optionally .gz) or .xlsx.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5 or sys.argv[1] not in ('events', 'pairs'):
+        print(__doc__)
+        sys.exit(1)
+    record, start, end, output = sys.argv[1:]
+    try:
+        written = export_tap_history(output, date.fromisoformat(start), date.fromisoformat(end), record)
+    except ValueError as e:
+        print(e)
+        written = None
+    close_connections()
+    if written is None:
+        sys.exit(1)
+    print(f"Exported {written} rows to {output}.")
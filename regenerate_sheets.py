@@ -0,0 +1,159 @@
+# regenerate_sheets.py
+"""
+Rebuilds daily xlsx sheets from tap_events.
+
+Use this when sheets were deleted, damaged or edited by hand, or (with
+--force) after the form template changed. Rows for each day are read from
+the database in this process; saving is fanned out across a process pool.
+Each existing sheet's rows are first compared with the database straight
+from the worksheet XML, and the file is left alone when they match, so
+running the same range twice writes nothing the second time. Days that
+have a sheet but no taps in the database are skipped and listed in the
+report, since such a sheet may predate the database; --blank rebuilds them
+as empty forms (a sheet from before the database export that has rows is
+still kept, see Generate.write_daily_sheet).
+
+Run it with the application closed, or at least not on today's sheet.
+
+Command line:
+    python regenerate_sheets.py <start YYYY-MM-DD> [<end YYYY-MM-DD>] [--force] [--blank] [--workers N]
+
+--force rebuilds every day from the template, even when its rows match.
+--blank also rebuilds sheets whose day has no taps in the database.
+"""
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from database_manager import get_tap_days, fetch_day_sheet, close_connections
+from Generate import sheet_view, sheet_file_path, template_path, write_daily_sheet, is_exported_sheet
+from xlsx_patch import sheet_rows_match
+
+WRITTEN = 'written'
+UNCHANGED = 'unchanged'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def regenerate_day(target_date, rows, force=False):
+    """
+    Rebuilds one day's sheet from its database rows unless the file already
+    matches them. Returns WRITTEN, UNCHANGED, SKIPPED or FAILED. Runs in a pool process.
+    """
+    file_path = sheet_file_path(target_date)
+    if os.path.exists(file_path):
+        if not force and sheet_rows_match(file_path, sheet_view(target_date, rows)[2]):
+            return UNCHANGED
+        if not rows and not is_exported_sheet(file_path):
+            return SKIPPED  # write_daily_sheet keeps a pre-export sheet that has rows
+    return WRITTEN if write_daily_sheet(target_date, rows, patch=False) else FAILED
+
+
+def _sheet_days(start_date, end_date):
+    """Returns the days to rebuild: every day with taps plus every day that already has a sheet."""
+    days = set(get_tap_days(start_date, end_date))
+    day = start_date
+    while day <= end_date:
+        if os.path.exists(sheet_file_path(day)):
+            days.add(day)
+        day += timedelta(days=1)
+    return sorted(days)
+
+
+def regenerate_sheets(start_date, end_date=None, force=False, workers=None, progress=None, blank=False):
+    """
+    Rebuilds the sheets for an inclusive date range. `progress(done, total)` is
+    called as days finish. Sheets for days without taps are SKIPPED unless
+    `blank` is set. Returns {WRITTEN: [dates], UNCHANGED: [dates],
+    SKIPPED: [dates], FAILED: [dates]}. Raises sqlite3.Error if the days to
+    rebuild cannot be read from the database.
+    """
+    end_date = end_date or start_date
+    days = _sheet_days(start_date, end_date)
+    results = {WRITTEN: [], UNCHANGED: [], SKIPPED: [], FAILED: []}
+    if not days:
+        return results
+
+    # Render the template once here, so the pool processes never race to create it.
+    template_path()
+    workers = min(workers or os.cpu_count() or 1, len(days))
+
+    def rows_for(day):
+        # None rather than [] on a database error, so a populated sheet is never rebuilt blank.
+        try:
+            return fetch_day_sheet(day)
+        except sqlite3.Error as e:
+            print(f"Error reading the rows for {day}: {e}")
+            return None
+
+    def record(day, outcome):
+        results[outcome].append(day)
+        if progress:
+            progress(sum(len(dates) for dates in results.values()), len(days))
+
+    if workers == 1:
+        for day in days:
+            rows = rows_for(day)
+            if rows is None:
+                record(day, FAILED)
+            elif not rows and not blank:
+                record(day, SKIPPED)
+            else:
+                record(day, regenerate_day(day, rows, force))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for day in days:
+                rows = rows_for(day)
+                if rows is None:
+                    record(day, FAILED)
+                elif not rows and not blank:
+                    record(day, SKIPPED)
+                else:
+                    futures[pool.submit(regenerate_day, day, rows, force)] = day
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"Error regenerating the sheet for {futures[future]}: {e}")
+                    outcome = FAILED
+                record(futures[future], outcome)
+
+    for dates in results.values():
+        dates.sort()
+    return results
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    force = '--force' in args
+    blank = '--blank' in args
+    workers = None
+    if '--workers' in args:
+        index = args.index('--workers')
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    dates = [arg for arg in args if arg not in ('--force', '--blank')]
+    if not 1 <= len(dates) <= 2:
+        print(__doc__)
+        sys.exit(1)
+
+    start = date.fromisoformat(dates[0])
+    end = date.fromisoformat(dates[-1])
+    try:
+        result = regenerate_sheets(start, end, force=force, workers=workers, blank=blank)
+    except sqlite3.Error:
+        close_connections()
+        sys.exit(1)
+    close_connections()
+    print(f"{len(result[WRITTEN])} written, {len(result[UNCHANGED])} unchanged, "
+          f"{len(result[SKIPPED])} skipped, {len(result[FAILED])} failed.")
+    for day in result[SKIPPED]:
+        print(f"  skipped (no taps in the database): {day}")
+    if result[SKIPPED] and not blank:
+        print("Use --blank to rebuild skipped sheets as empty forms.")
+    for day in result[FAILED]:
+        print(f"  failed: {day}")
+    sys.exit(1 if result[FAILED] else 0)
@@ -0,0 +1,52 @@
+# result_bridge.py
+"""
+Hands the results of background work back to the GUI thread.
+
+The database worker and the job executor both run callables off the GUI
+thread and report back through a ResultBridge: its signals are emitted from
+the worker threads and delivered, through Qt's queued connections, in the
+thread the bridge lives in.
+"""
+from concurrent.futures import CancelledError
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+
+class ResultBridge(QObject):
+    """Lives in the GUI thread; signals emitted from worker threads are delivered there."""
+    finished = Signal(object, object, object)  # (on_result, on_error), result, exception
+
+    def __init__(self, label="Background job", parent=None):
+        super().__init__(parent)
+        self._label = label
+        self.finished.connect(self._deliver)
+
+    def deliver(self, future, on_result=None, on_error=None):
+        """
+        Calls on_result(result) or on_error(exception) in the bridge's thread
+        once `future` finishes. Nothing is delivered for a cancelled future.
+        Returns the Future.
+        """
+        callbacks = (on_result, on_error)
+
+        def _done(f):
+            if f.cancelled():
+                return
+            error = f.exception()
+            if isinstance(error, CancelledError):
+                return
+            self.finished.emit(callbacks, None if error else f.result(), error)
+
+        future.add_done_callback(_done)
+        return future
+
+    @Slot(object, object, object)
+    def _deliver(self, callbacks, result, error):
+        on_result, on_error = callbacks
+        if error is not None:
+            if on_error:
+                on_error(error)
+            else:
+                print(f"{self._label} failed: {error!r}")
+        elif on_result:
+            on_result(result)
@@ -0,0 +1,403 @@
+# schema_migrations.py
+"""
+Versioned schema migrations for tap_history.db.
+
+The schema version is stored in PRAGMA user_version. Each entry in MIGRATIONS
+upgrades the database from version - 1 to version; apply_migrations() runs only
+the pending ones, so a database that is already current costs a single pragma
+read at startup. Migrations listed in OUTSIDE_TRANSACTION (VACUUM cannot run
+inside one) must be safe to repeat if interrupted.
+"""
+import sqlite3
+
+
+def _baseline(conn):
+    # Databases created before versioning already have these tables.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tap_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            staff_name TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            event_date TEXT NOT NULL, -- YYYY-MM-DD format for easy querying by date
+            token INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS staff (
+            token INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+
+
+def _tap_event_indexes(conn):
+    # Covers get_taps_for_staff_and_date without touching the table rows.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tap_events_date_name_ts
+        ON tap_events (event_date, staff_name, timestamp)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tap_events_token_date
+        ON tap_events (token, event_date)
+    ''')
+
+
+def _integer_timestamps(conn):
+    # Rebuild tap_events with integer columns. ts is seconds since 1970-01-01
+    # of the local wall-clock time (no timezone shift), day is ts // 86400.
+    conn.execute('''
+        CREATE TABLE tap_events_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            staff_name TEXT NOT NULL,
+            token INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            day INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO tap_events_new (id, staff_name, token, ts, day)
+        SELECT id, staff_name, token,
+               CAST(strftime('%s', timestamp) AS INTEGER),
+               CAST(julianday(event_date) - 2440587.5 AS INTEGER)
+        FROM tap_events
+    ''')
+    conn.execute("DROP TABLE tap_events")
+    conn.execute("ALTER TABLE tap_events_new RENAME TO tap_events")
+    conn.execute('''
+        CREATE INDEX idx_tap_events_day_name_ts
+        ON tap_events (day, staff_name, ts)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_tap_events_token_day
+        ON tap_events (token, day)
+    ''')
+
+
+def _normalize_staff(conn):
+    # staff gets a surrogate id so renames and token changes keep their history;
+    # deleted staff are kept inactive. Names and tokens stay unique among
+    # active staff only.
+    conn.execute('''
+        CREATE TABLE staff_new (
+            id INTEGER PRIMARY KEY,
+            token INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            active INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    conn.execute("INSERT INTO staff_new (token, name) SELECT token, name FROM staff ORDER BY name")
+    # Taps from tokens that were already deleted or renamed away get an inactive
+    # staff row carrying the most recent name seen for that token.
+    conn.execute('''
+        INSERT INTO staff_new (token, name, active)
+        SELECT token, staff_name, 0 FROM (
+            SELECT token, staff_name, MAX(id) FROM tap_events
+            WHERE token NOT IN (SELECT token FROM staff)
+            GROUP BY token
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE tap_events_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            staff_id INTEGER NOT NULL REFERENCES staff (id),
+            ts INTEGER NOT NULL,
+            day INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO tap_events_new (id, staff_id, ts, day)
+        SELECT t.id, s.id, t.ts, t.day
+        FROM tap_events t JOIN staff_new s ON s.token = t.token
+    ''')
+    conn.execute("DROP TABLE tap_events")
+    conn.execute("DROP TABLE staff")
+    conn.execute("ALTER TABLE staff_new RENAME TO staff")
+    conn.execute("ALTER TABLE tap_events_new RENAME TO tap_events")
+    conn.execute("CREATE UNIQUE INDEX idx_staff_token ON staff (token) WHERE active = 1")
+    conn.execute("CREATE UNIQUE INDEX idx_staff_name ON staff (name) WHERE active = 1")
+    conn.execute("CREATE INDEX idx_tap_events_staff_day_ts ON tap_events (staff_id, day, ts)")
+    conn.execute("CREATE INDEX idx_tap_events_day_staff_ts ON tap_events (day, staff_id, ts)")
+
+
+def _daily_summary(conn):
+    # One row per staff member per day, kept in step with tap_events by a
+    # trigger. A tap at an even position (2nd, 4th, ...) is a clock-out.
+    conn.execute('''
+        CREATE TABLE daily_summary (
+            staff_id INTEGER NOT NULL REFERENCES staff (id),
+            day INTEGER NOT NULL,
+            first_in INTEGER NOT NULL,
+            last_tap INTEGER NOT NULL,
+            clock_out INTEGER,
+            tap_count INTEGER NOT NULL,
+            clocked_out INTEGER NOT NULL,
+            PRIMARY KEY (staff_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX idx_daily_summary_day ON daily_summary (day, clocked_out)")
+    conn.execute('''
+        CREATE TRIGGER trg_tap_events_summary AFTER INSERT ON tap_events
+        BEGIN
+            INSERT INTO daily_summary (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+            VALUES (NEW.staff_id, NEW.day, NEW.ts, NEW.ts, NULL, 1, 0)
+            ON CONFLICT (staff_id, day) DO UPDATE SET
+                first_in = MIN(first_in, excluded.first_in),
+                last_tap = MAX(last_tap, excluded.last_tap),
+                clock_out = CASE WHEN (tap_count + 1) % 2 = 0 THEN excluded.last_tap ELSE clock_out END,
+                tap_count = tap_count + 1,
+                clocked_out = (tap_count + 1) % 2 = 0;
+        END
+    ''')
+    rebuild_daily_summary(conn)
+
+
+def rebuild_daily_summary(conn, schema='main'):
+    """
+    Recomputes every daily_summary row in `schema` from its tap_events. Taps
+    are numbered in time order (ties broken by id), so a backdated entry
+    lands at its place in the day rather than at the end.
+    """
+    conn.execute(f"DELETE FROM {schema}.daily_summary")
+    conn.execute(f'''
+        INSERT INTO {schema}.daily_summary (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+        SELECT staff_id, day, MIN(ts), MAX(ts),
+               MAX(CASE WHEN rn = cnt - cnt % 2 THEN ts END),
+               cnt, cnt % 2 = 0
+        FROM (
+            SELECT staff_id, day, ts,
+                   ROW_NUMBER() OVER (PARTITION BY staff_id, day ORDER BY ts, id) AS rn,
+                   COUNT(*) OVER (PARTITION BY staff_id, day) AS cnt
+            FROM {schema}.tap_events
+        )
+        GROUP BY staff_id, day
+    ''')
+
+
+def _staff_revision(conn):
+    # A counter bumped on every roster change, so other connections can tell
+    # a staff edit apart from ordinary tap inserts after PRAGMA data_version moves.
+    conn.execute('''
+        CREATE TABLE change_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("INSERT INTO change_counters (name, value) VALUES ('staff', 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER trg_staff_revision_{event.lower()} AFTER {event} ON staff
+            BEGIN
+                UPDATE change_counters SET value = value + 1 WHERE name = 'staff';
+            END
+        ''')
+
+
+def _incremental_vacuum(conn):
+    # auto_vacuum only takes effect on an existing database after a VACUUM.
+    # Free pages are then returned to the OS by the maintenance scheduler
+    # with PRAGMA incremental_vacuum instead of a full offline VACUUM.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def _tap_kind(conn):
+    # Records how each tap was made, so the daily sheet can be rebuilt from the
+    # database with its remarks: 'swipe', 'manual_in' or 'manual_out'.
+    conn.execute("ALTER TABLE tap_events ADD COLUMN kind TEXT NOT NULL DEFAULT 'swipe'")
+
+
+def _pending_exports(conn):
+    # Days whose sheet could not be saved (usually because it is open in
+    # Excel). The sheet writer retries them with backoff, including after a
+    # restart, until the file can be written again.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pending_exports (
+            day INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            queued_ts INTEGER NOT NULL
+        )
+    ''')
+
+
+def _summary_in_tap_order(conn):
+    # The old trigger took the most recently inserted tap as the clock-out, so
+    # a backdated manual entry or a swipe on a past sheet could leave
+    # clock_out earlier than the real last tap. Taps that arrive in time order
+    # (nearly all of them) still update the row in place; one earlier than
+    # the day's last tap recomputes that staff member's day in time order.
+    conn.execute("DROP TRIGGER IF EXISTS trg_tap_events_summary")
+    conn.execute('''
+        CREATE TRIGGER trg_tap_events_summary AFTER INSERT ON tap_events
+        BEGIN
+            INSERT INTO daily_summary (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+            SELECT NEW.staff_id, NEW.day, NEW.ts, NEW.ts, NULL, 1, 0
+            WHERE NOT EXISTS (
+                SELECT 1 FROM daily_summary
+                WHERE staff_id = NEW.staff_id AND day = NEW.day AND last_tap > NEW.ts
+            )
+            ON CONFLICT (staff_id, day) DO UPDATE SET
+                last_tap = excluded.last_tap,
+                clock_out = CASE WHEN (tap_count + 1) % 2 = 0 THEN excluded.last_tap ELSE clock_out END,
+                tap_count = tap_count + 1,
+                clocked_out = (tap_count + 1) % 2 = 0;
+
+            INSERT OR REPLACE INTO daily_summary
+                (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+            SELECT staff_id, day, MIN(ts), MAX(ts),
+                   MAX(CASE WHEN rn = cnt - cnt % 2 THEN ts END),
+                   cnt, cnt % 2 = 0
+            FROM (
+                SELECT staff_id, day, ts,
+                       ROW_NUMBER() OVER (ORDER BY ts, id) AS rn,
+                       COUNT(*) OVER () AS cnt
+                FROM tap_events
+                WHERE staff_id = NEW.staff_id AND day = NEW.day
+                  AND EXISTS (
+                      SELECT 1 FROM daily_summary
+                      WHERE staff_id = NEW.staff_id AND day = NEW.day AND last_tap > NEW.ts
+                  )
+            )
+            GROUP BY staff_id, day;
+        END
+    ''')
+    rebuild_daily_summary(conn)
+
+
+def _soft_delete(conn):
+    # "Delete Entry" on a sheet marks the day's taps deleted instead of
+    # removing them, so the history stays on record. daily_summary and the
+    # sheets count only taps that are not deleted; a deletion recomputes the
+    # staff member's day and drops its summary row if nothing is left.
+    # No tap is deleted before this version, so rebuild_daily_summary (used
+    # by migrations 5 and 10) does not need the filter.
+    conn.execute("ALTER TABLE tap_events ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+    conn.execute("DROP TRIGGER IF EXISTS trg_tap_events_summary")
+    conn.execute('''
+        CREATE TRIGGER trg_tap_events_summary AFTER INSERT ON tap_events WHEN NEW.deleted = 0
+        BEGIN
+            INSERT INTO daily_summary (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+            SELECT NEW.staff_id, NEW.day, NEW.ts, NEW.ts, NULL, 1, 0
+            WHERE NOT EXISTS (
+                SELECT 1 FROM daily_summary
+                WHERE staff_id = NEW.staff_id AND day = NEW.day AND last_tap > NEW.ts
+            )
+            ON CONFLICT (staff_id, day) DO UPDATE SET
+                last_tap = excluded.last_tap,
+                clock_out = CASE WHEN (tap_count + 1) % 2 = 0 THEN excluded.last_tap ELSE clock_out END,
+                tap_count = tap_count + 1,
+                clocked_out = (tap_count + 1) % 2 = 0;
+
+            INSERT OR REPLACE INTO daily_summary
+                (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+            SELECT staff_id, day, MIN(ts), MAX(ts),
+                   MAX(CASE WHEN rn = cnt - cnt % 2 THEN ts END),
+                   cnt, cnt % 2 = 0
+            FROM (
+                SELECT staff_id, day, ts,
+                       ROW_NUMBER() OVER (ORDER BY ts, id) AS rn,
+                       COUNT(*) OVER () AS cnt
+                FROM tap_events
+                WHERE staff_id = NEW.staff_id AND day = NEW.day AND deleted = 0
+                  AND EXISTS (
+                      SELECT 1 FROM daily_summary
+                      WHERE staff_id = NEW.staff_id AND day = NEW.day AND last_tap > NEW.ts
+                  )
+            )
+            GROUP BY staff_id, day;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_tap_events_summary_delete AFTER UPDATE OF deleted ON tap_events
+        BEGIN
+            DELETE FROM daily_summary WHERE staff_id = NEW.staff_id AND day = NEW.day;
+            INSERT INTO daily_summary (staff_id, day, first_in, last_tap, clock_out, tap_count, clocked_out)
+            SELECT staff_id, day, MIN(ts), MAX(ts),
+                   MAX(CASE WHEN rn = cnt - cnt % 2 THEN ts END),
+                   cnt, cnt % 2 = 0
+            FROM (
+                SELECT staff_id, day, ts,
+                       ROW_NUMBER() OVER (ORDER BY ts, id) AS rn,
+                       COUNT(*) OVER () AS cnt
+                FROM tap_events
+                WHERE staff_id = NEW.staff_id AND day = NEW.day AND deleted = 0
+            )
+            GROUP BY staff_id, day;
+        END
+    ''')
+
+
+# (version, description, function taking the connection)
+MIGRATIONS = [
+    (1, "Create tap_events and staff tables", _baseline),
+    (2, "Index tap_events by date/name and token/date", _tap_event_indexes),
+    (3, "Store tap_events times as integer epoch seconds and day numbers", _integer_timestamps),
+    (4, "Reference staff from tap_events by surrogate id", _normalize_staff),
+    (5, "Add trigger-maintained daily_summary table", _daily_summary),
+    (6, "Count staff changes for cross-connection change detection", _staff_revision),
+    (7, "Enable incremental auto_vacuum", _incremental_vacuum),
+    (8, "Record whether each tap was a swipe or a manual entry", _tap_kind),
+    (9, "Track daily sheets waiting to be saved", _pending_exports),
+    (10, "Order daily_summary clock-outs by tap time", _summary_in_tap_order),
+    (11, "Keep deleted sheet entries as soft-deleted taps", _soft_delete),
+]
+
+# Versions whose migration runs without a surrounding transaction.
+OUTSIDE_TRANSACTION = {7}
+
+# Data changes that per-year archives need as well, keyed by the version that
+# introduced them. tap_partitions runs each one, given (connection, schema),
+# when it brings an archive from an older version up to date.
+ARCHIVE_DATA_MIGRATIONS = {
+    10: rebuild_daily_summary,
+}
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Returns the schema version recorded in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """
+    Brings the database up to LATEST_VERSION. Each migration (other than those
+    in OUTSIDE_TRANSACTION) runs in its own transaction together with the
+    user_version bump, so a failure leaves the database at the last fully
+    applied version. Foreign keys are switched off
+    while tables are rebuilt and checked before each commit.
+    Returns the list of versions that were applied.
+    """
+    current = get_schema_version(conn)
+    applied = []
+    if current >= LATEST_VERSION:
+        return applied
+
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            if version in OUTSIDE_TRANSACTION:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                print(f"Applied schema migration {version}: {description}")
+                applied.append(version)
+                continue
+            try:
+                conn.execute("BEGIN")
+                migration(conn)
+                if conn.execute("PRAGMA foreign_key_check").fetchone():
+                    raise sqlite3.IntegrityError(f"Migration {version} left dangling foreign keys")
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            print(f"Applied schema migration {version}: {description}")
+            applied.append(version)
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    return applied
@@ -0,0 +1,250 @@
+# sheet_export.py
+"""
+Keeps the daily xlsx sheets in step with the database.
+
+tap_events is the source of truth; a day's sheet is a derived export that is
+re-rendered from the database after each change. Exports are write-behind:
+requests for the same day are coalesced for ExcelWriteDelayMs, or until
+ExcelWriteMaxEvents have piled up, and then the day is rendered and saved
+once on a background thread. A burst of swipes at shift change therefore
+costs one save instead of one per swipe.
+
+A save that fails (usually because the sheet is open in Excel) never holds
+up swipes: the day is recorded in the pending_exports table and retried with
+exponential backoff, oldest day first, until the file can be written again,
+including after a restart. Until then the day is displayed straight from the
+database.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from config_manager import (
+    load_excel_write_delay_ms, load_excel_write_max_events, load_export_retry_seconds, load_export_retry_max_seconds
+)
+from database_manager import (
+    get_day_sheet, fetch_day_sheet, queue_pending_export, clear_pending_export, get_pending_exports
+)
+from Generate import (
+    write_daily_sheet, read_daily_sheet, sheet_view, sheet_file_path, sheet_date_from_path, is_exported_sheet
+)
+from job_executor import get_job_executor
+
+
+def export_daily_sheet(sheet_date):
+    """
+    Re-renders one day's sheet from the database. Returns the file path, or
+    None if it could not be saved. A failed database read raises, so the
+    sheet is retried instead of being overwritten with a blank form.
+    """
+    return write_daily_sheet(sheet_date, fetch_day_sheet(sheet_date))
+
+
+class SheetWriter(threading.Thread):
+    """A thread that coalesces export requests per day and writes each day once per window."""
+
+    def __init__(self, delay_ms=None, max_events=None, retry_seconds=None, retry_max_seconds=None):
+        super().__init__(name="SheetWriter", daemon=True)
+        self.delay_ms = load_excel_write_delay_ms() if delay_ms is None else delay_ms
+        self.max_events = max(1, load_excel_write_max_events() if max_events is None else max_events)
+        self.retry_seconds = load_export_retry_seconds() if retry_seconds is None else retry_seconds
+        self.retry_max_seconds = load_export_retry_max_seconds() if retry_max_seconds is None else retry_max_seconds
+        self._cond = threading.Condition()
+        self._pending = {}  # sheet date -> Future shared by every request for that day
+        self._events = 0
+        self._first_request = None
+        self._flush_requested = False
+        self._stopping = False
+        self._backlog = {}  # sheet date -> time.monotonic() of its next retry, for sheets that could not be saved
+
+    def request(self, sheet_date):
+        """Marks a day's sheet as out of date. Returns a Future for the export that will include it."""
+        with self._cond:
+            future = self._pending.get(sheet_date)
+            if future is None:
+                future = self._pending[sheet_date] = Future()
+            self._events += 1
+            if self._first_request is None:
+                self._first_request = time.monotonic()
+            self._cond.notify()
+            return future
+
+    def flush(self, wait=False):
+        """Writes every pending sheet now instead of at the end of the window."""
+        with self._cond:
+            futures = list(self._pending.values())
+            self._flush_requested = True
+            self._cond.notify()
+        if wait:
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    pass  # already reported by the export
+
+    def backlog_depth(self):
+        """Returns how many days are waiting for their sheet to be saved."""
+        with self._cond:
+            return len(self._backlog)
+
+    def is_backlogged(self, sheet_date):
+        """True while a day's sheet on disk is behind the database because it could not be saved."""
+        with self._cond:
+            return sheet_date in self._backlog
+
+    def _take_batch(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                # Retries stop at shutdown; the backlog is picked up again on the next start.
+                next_retry = None if self._stopping else min(self._backlog.values(), default=None)
+                if self._pending:
+                    if self._stopping or self._flush_requested or self._events >= self.max_events:
+                        break
+                    remaining = self._first_request + self.delay_ms / 1000 - now
+                    if remaining <= 0:
+                        break
+                elif self._stopping:
+                    return None
+                else:
+                    self._flush_requested = False
+                    remaining = None
+                if next_retry is not None:
+                    if next_retry <= now:
+                        break
+                    remaining = next_retry - now if remaining is None else min(remaining, next_retry - now)
+                self._cond.wait(remaining)
+
+            batch, self._pending = self._pending, {}
+            if not self._stopping:
+                for sheet_date, retry_at in self._backlog.items():
+                    if retry_at <= now and sheet_date not in batch:
+                        batch[sheet_date] = Future()
+            self._events = 0
+            self._first_request = None
+            self._flush_requested = False
+            # Oldest day first, so a backlog is replayed in order.
+            return dict(sorted(batch.items()))
+
+    def _saved(self, sheet_date):
+        with self._cond:
+            was_backlogged = self._backlog.pop(sheet_date, None) is not None
+        if was_backlogged:
+            clear_pending_export(sheet_date)
+            print(f"Saved the sheet for {sheet_date} after it was unavailable.")
+
+    def _failed(self, sheet_date, error):
+        attempts = queue_pending_export(sheet_date, error) or 1
+        delay = min(self.retry_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        with self._cond:
+            self._backlog[sheet_date] = time.monotonic() + delay
+        print(f"Could not save the sheet for {sheet_date} (attempt {attempts}); retrying in {delay:g}s.")
+
+    def run(self):
+        with self._cond:
+            for sheet_date, _ in get_pending_exports():
+                self._backlog.setdefault(sheet_date, time.monotonic())
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # Saves run on the job executor, keyed by file so they never overlap a load of the same sheet.
+            executor = get_job_executor()
+            jobs = []
+            for sheet_date, future in batch.items():
+                if future.set_running_or_notify_cancel():
+                    jobs.append((sheet_date, future, executor.submit(
+                        export_daily_sheet, sheet_date, key=sheet_file_path(sheet_date), name="Export sheet")))
+            for sheet_date, future, job in jobs:
+                try:
+                    file_path = job.result()
+                except Exception as e:
+                    print(f"Error exporting sheet for {sheet_date}: {e}")
+                    self._failed(sheet_date, str(e))
+                    future.set_exception(e)
+                    continue
+                if file_path is None:
+                    self._failed(sheet_date, "The sheet could not be saved; it may be open in another program.")
+                else:
+                    self._saved(sheet_date)
+                future.set_result(file_path)
+
+    def stop(self, timeout=30.0):
+        """Writes every pending sheet, then stops the thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self.is_alive():
+            self.join(timeout)
+
+
+_writer = None
+
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        _writer = SheetWriter()
+        _writer.start()
+    return _writer
+
+
+def schedule_export(sheet_date, immediate=False):
+    """
+    Queues a re-render of a day's sheet and returns a Future resolving to its
+    file path (None if it could not be saved). Pass immediate=True when the
+    user is waiting to see the result.
+    """
+    writer = _get_writer()
+    future = writer.request(sheet_date)
+    if immediate:
+        writer.flush()
+    return future
+
+
+def reconcile_export(sheet_date):
+    """
+    Called when a day is opened. Queues an immediate export if the sheet may
+    be behind the database: it is missing, waiting to be retried, or was
+    written by the exporter (whose last export a crash or quit can lose; rows
+    that already match leave the file untouched). A sheet from before the
+    database export is only displayed, never rewritten. Returns the export's
+    Future, or None if nothing was queued.
+    """
+    file_path = sheet_file_path(sheet_date)
+    if os.path.exists(file_path) and not _get_writer().is_backlogged(sheet_date) \
+            and not is_exported_sheet(file_path):
+        return None
+    return schedule_export(sheet_date, immediate=True)
+
+
+def flush_exports(wait=False):
+    """Writes every pending sheet now, e.g. before switching to another day."""
+    if _writer is not None:
+        _writer.flush(wait)
+
+
+def pending_export_count():
+    """Returns how many days' sheets are waiting to be saved (starting the writer, and its retries, on first use)."""
+    return _get_writer().backlog_depth()
+
+
+def load_sheet_for_display(file_path):
+    """
+    Returns a sheet in read_daily_sheet's form. A day whose sheet is waiting
+    to be saved is rendered from the database instead of the stale file.
+    """
+    try:
+        sheet_date = sheet_date_from_path(file_path)
+    except ValueError:
+        return read_daily_sheet(file_path)
+    if _writer is not None and _writer.is_backlogged(sheet_date):
+        return sheet_view(sheet_date, get_day_sheet(sheet_date))
+    return read_daily_sheet(file_path)
+
+
+def shutdown_exports():
+    """Writes every pending sheet and stops the writer. Call before the database connections are closed."""
+    if _writer is not None:
+        _writer.stop()
@@ -0,0 +1,205 @@
+# staff_directory.py
+from PySide6.QtCore import QObject, Signal, QTimer
+
+from database_manager import (
+    get_all_staff, add_staff_member, update_staff_member, delete_staff_member,
+    get_data_version, get_staff_revision
+)
+from db_worker import get_db_worker
+
+
+def _load_roster():
+    """Worker-side: returns (data_version, staff revision, members)."""
+    return get_data_version(), get_staff_revision(), get_all_staff()
+
+
+def _poll_roster(known_version, known_revision):
+    """
+    Worker-side: returns (data_version, revision, members-or-None). The roster
+    is only read when the staff revision moved.
+    """
+    data_version = get_data_version()
+    if data_version is None or data_version == known_version:
+        return known_version, known_revision, None
+    revision = get_staff_revision()
+    if revision == known_revision:
+        return data_version, revision, None
+    return data_version, revision, get_all_staff()
+
+
+def _write_roster(write, *args):
+    """Worker-side: runs a staff write and returns (its result, revision after it)."""
+    result = write(*args)
+    return result, get_staff_revision()
+
+
+class StaffDirectory(QObject):
+    """
+    The in-memory staff roster shared by every page and dialog.
+
+    The roster is loaded from the database once and then kept current: edits
+    made through this object are applied to the indexes incrementally, and
+    edits made by other connections are picked up by polling PRAGMA
+    data_version. Subscribers are told about each change through signals.
+    All database access goes through the DatabaseWorker; edits report back
+    through an optional on_done(success) callback on the GUI thread.
+    """
+    member_added = Signal(dict)           # member
+    member_updated = Signal(int, dict)    # original token, member
+    member_removed = Signal(dict)         # member
+    reloaded = Signal()                   # roster replaced after an external change
+
+    POLL_INTERVAL_MS = 2000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._worker = get_db_worker()
+        self._by_token = {}
+        self._by_name = {}
+        self._data_version = None
+        self._revision = None
+        self._poll_pending = False
+        # Pages build their tables from the roster, so the first load is waited for.
+        self._apply_roster(*self._worker.submit(_load_roster).result())
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(self.POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self.check_external_changes)
+        self._poll_timer.start()
+
+    def _apply_roster(self, data_version, revision, members):
+        self._by_token = {member['token']: member for member in members}
+        self._by_name = {member['name']: member for member in self._by_token.values()}
+        self._data_version = data_version
+        self._revision = revision
+
+    def _index(self, member):
+        self._by_token[member['token']] = member
+        self._by_name[member['name']] = member
+
+    def _unindex(self, member):
+        self._by_token.pop(member['token'], None)
+        self._by_name.pop(member['name'], None)
+
+    # --- Lookups ---
+
+    def get(self, token):
+        """Returns the member dict for a token, or None."""
+        return self._by_token.get(token)
+
+    def name_for(self, token):
+        member = self._by_token.get(token)
+        return member['name'] if member else None
+
+    def token_for(self, name):
+        member = self._by_name.get(name)
+        return member['token'] if member else None
+
+    def __contains__(self, token):
+        return token in self._by_token
+
+    def __len__(self):
+        return len(self._by_token)
+
+    def all(self):
+        """Returns every member, sorted by name."""
+        return sorted(self._by_token.values(), key=lambda member: member['name'])
+
+    # --- Edits ---
+
+    def add(self, token, name, on_done=None):
+        """Adds a member. on_done(False) if the token or name is already in use."""
+        if token in self._by_token or name in self._by_name:
+            self._report(on_done, False)
+            return
+
+        def _added(result):
+            staff_id, self._revision = result
+            if staff_id is not None:
+                member = {'id': staff_id, 'token': token, 'name': name}
+                self._index(member)
+                self.member_added.emit(member)
+            self._report(on_done, staff_id is not None)
+
+        self._worker.call(_write_roster, add_staff_member, token, name,
+                          on_result=_added, on_error=lambda e: self._report(on_done, False))
+
+    def update(self, original_token, new_token, new_name, on_done=None):
+        """Changes a member's token and/or name."""
+        if original_token not in self._by_token:
+            self._report(on_done, False)
+            return
+
+        def _updated(result):
+            ok, self._revision = result
+            member = self._by_token.get(original_token)
+            if ok and member is not None:
+                self._unindex(member)
+                updated = dict(member, token=new_token, name=new_name)
+                self._index(updated)
+                self.member_updated.emit(original_token, updated)
+            self._report(on_done, ok)
+
+        self._worker.call(_write_roster, update_staff_member, original_token, new_token, new_name,
+                          on_result=_updated, on_error=lambda e: self._report(on_done, False))
+
+    def remove(self, token, on_done=None):
+        """Removes a member from the roster. Their tap history is kept."""
+        if token not in self._by_token:
+            self._report(on_done, False)
+            return
+
+        def _removed(result):
+            ok, self._revision = result
+            member = self._by_token.get(token)
+            if ok and member is not None:
+                self._unindex(member)
+                self.member_removed.emit(member)
+            self._report(on_done, ok)
+
+        self._worker.call(_write_roster, delete_staff_member, token,
+                          on_result=_removed, on_error=lambda e: self._report(on_done, False))
+
+    @staticmethod
+    def _report(on_done, ok):
+        if on_done:
+            on_done(ok)
+
+    # --- External changes ---
+
+    def check_external_changes(self):
+        """
+        Reloads the roster if another connection changed the staff table.
+        data_version moves on every foreign commit (taps included), so the
+        staff revision counter is only read when it does. Edits made through
+        this object run on the worker's own connection and do not move it.
+        """
+        if self._poll_pending:
+            return
+        self._poll_pending = True
+        self._worker.call(_poll_roster, self._data_version, self._revision,
+                          on_result=self._on_poll_result, on_error=self._on_poll_error)
+
+    def _on_poll_result(self, result):
+        self._poll_pending = False
+        data_version, revision, members = result
+        if members is None:
+            self._data_version = data_version
+            return
+        self._apply_roster(data_version, revision, members)
+        self.reloaded.emit()
+
+    def _on_poll_error(self, error):
+        self._poll_pending = False
+        print(f"Error checking for staff changes: {error}")
+
+
+_directory = None
+
+
+def get_staff_directory():
+    """Returns the application-wide StaffDirectory, creating it on first use."""
+    global _directory
+    if _directory is None:
+        _directory = StaffDirectory()
+    return _directory
@@ -1,4 +1,3 @@
-import os
 from PySide6.QtCore import Qt, QTimer, QTime
 from PySide6.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QAbstractItemView, QMenu
 from PySide6.QtGui import QFont, QColor, QAction
@@ -6,8 +5,12 @@ from datetime import datetime
 
 import constants as c
 from history_dialog import StaffHistoryDialog
-from database_manager import get_taps_for_staff_and_date, log_tap_event
+from database_manager import get_taps_for_staff_and_date, record_manual_tap, delete_day_entry
+from db_worker import get_db_worker
+from job_executor import get_job_executor, PRIORITY_HIGH
 from time_selector_dialog import TimeSelectorDialog
+from Generate import sheet_date_from_path
+from sheet_export import schedule_export, load_sheet_for_display
 
 try:
     import openpyxl
@@ -60,168 +63,158 @@ class SignInTable(QTableWidget):
         self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
 
         self.current_excel_file_path = None
+        # Name -> row of the rows shown, and the first row without a name, so
+        # swipes find their row without scanning the table.
+        self._row_index = {}
+        self._next_free_row = 0
+        self._load_future = None
 
-    def display_excel_content(self, file_path):
+    def display_excel_content(self, file_path, on_done=None):
+        """
+        Loads a sheet on the job executor and shows it. on_done(date_str) is
+        called in the GUI thread afterwards, with None if it could not be read.
+        A newer call supersedes a load that is still in progress.
+        """
         if not openpyxl:
             QMessageBox.critical(self, "Missing Dependency", "The 'openpyxl' library is required.")
-            return None
+            if on_done:
+                on_done(None)
+            return
         self.current_excel_file_path = file_path
-        try:
-            workbook = openpyxl.load_workbook(file_path, data_only=True)
-            sheet = workbook.active
-            headers = [cell.value for cell in sheet[2]]
-
-            file_date_str = None
-            for col_idx in range(1, sheet.max_column + 1):
-                cell_value = sheet.cell(row=1, column=col_idx).value
-                if isinstance(cell_value, str) and '/' in cell_value:
-                    file_date_str = cell_value
-                    break
-            if not file_date_str:
-                file_date_str = sheet['D1'].value if sheet.max_column >= 4 else sheet['C1'].value
-
-            self.setColumnCount(len(headers))
-            self.setHorizontalHeaderLabels(headers)
-            all_rows = list(sheet.iter_rows(min_row=3, values_only=True))
-            self.setRowCount(len(all_rows))
-            for row_idx, row_data in enumerate(all_rows):
-                for col_idx, cell_value in enumerate(row_data):
-                    item = QTableWidgetItem(str(cell_value) if cell_value is not None else "")
-                    item.setForeground(QColor(c.WIN_COLOR_TEXT_PRIMARY))
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.setItem(row_idx, col_idx, item)
-
-            if self.columnCount() > 3:
-                self.setColumnHidden(3, True)
-            if self.columnCount() > 4:
-                self.setColumnHidden(4, True)
-
-            self.setColumnWidth(0, 350)
-            return file_date_str
-        except Exception as e:
-            QMessageBox.critical(self, "Error Reading File", f"Could not read the Excel file:\\n\\n{e}")
-            return None
-
-    def record_swipe(self, file_path, staff_name, current_time_str, total_taps, first_tap_time_str=None):
-        if not file_path or not openpyxl:
-            return "Error: File path or Excel library not available.", -1
-
-        password = "lsst1234"
+        executor = get_job_executor()
+        if self._load_future is not None:
+            executor.cancel(self._load_future)
 
-        try:
-            workbook = openpyxl.load_workbook(file_path)
-            sheet = workbook.active
-            sheet.protection.password = password
-            sheet.protection.sheet = False
-
-            target_row_excel = -1
-            for row in range(3, sheet.max_row + 200):
-                if sheet[f'A{row}'].value == staff_name:
-                    target_row_excel = row
-                    break
-
-            status_message = ""
-            row_to_update = -1
-
-            if target_row_excel == -1:
-                next_row_excel = 3
-                while sheet[f'A{next_row_excel}'].value is not None:
-                    next_row_excel += 1
-                row_to_update = next_row_excel
-                sheet[f'A{row_to_update}'] = staff_name
-
-                clock_in_time = first_tap_time_str if first_tap_time_str else current_time_str
-                sheet[f'B{row_to_update}'] = clock_in_time
-
-                if total_taps % 2 == 0:
-                    sheet[f'C{row_to_update}'] = current_time_str
-                    status_message = f"Clocked Out: {staff_name}"
-                else:
-                    status_message = f"Clocked In: {staff_name}"
-            else:
-                row_to_update = target_row_excel
-                if total_taps % 2 == 0:
-                    sheet[f'C{row_to_update}'] = current_time_str
-                    status_message = f"Clocked Out: {staff_name}"
-                else:
-                    status_message = f"Tap Recorded: {staff_name}"
-
-            target_row_widget = row_to_update - 3
-
-            existing_taps = sheet[f'E{row_to_update}'].value
-            new_taps = f"{existing_taps}, {current_time_str}" if existing_taps else current_time_str
-            sheet[f'E{row_to_update}'] = new_taps
-
-            sheet.protection.sheet = True
-            workbook.save(file_path)
-            return status_message, target_row_widget
+        def on_loaded(sheet):
+            if file_path != self.current_excel_file_path:
+                return
+            self._load_future = None
+            file_date_str = self._show_sheet(*sheet)
+            if on_done:
+                on_done(file_date_str)
 
-        except PermissionError:
-            QMessageBox.critical(self, "Permission Denied", "Could not save to Excel file.")
-            return "Save failed: Permission Denied.", -1
-        except Exception as e:
-            QMessageBox.critical(self, "Error Saving File", f"An error occurred while saving to Excel:\\n\\n{e}")
-            return "Save failed: An unexpected error occurred.", -1
-
-    def record_manual_entry(self, file_path, staff_name, selected_time, action_type):
-        if not file_path or not openpyxl:
-            return "Error: File path or Excel library not available.", -1
-        password = "lsst1234"
-        time_str = selected_time.toString("hh:mm:ss AP")
-        try:
-            workbook = openpyxl.load_workbook(file_path)
-            sheet = workbook.active
-            sheet.protection.password = password
-            sheet.protection.sheet = False
-            target_row_excel, is_clocked_out = -1, False
-            for row in range(3, sheet.max_row + 200):
-                if sheet[f'A{row}'].value == staff_name:
-                    target_row_excel = row
-                    if sheet[f'C{row}'].value:
-                        is_clocked_out = True
-                    break
-            status_message, target_row_widget = "", -1
-            row_to_update_taps = -1
-
-            if action_type == 'in':
-                if target_row_excel != -1:
-                    return f"Error: {staff_name} is already on today's sheet.", -1
-                next_row_excel = 3
-                while sheet[f'A{next_row_excel}'].value is not None:
-                    next_row_excel += 1
-                sheet[f'A{next_row_excel}'] = staff_name
-                sheet[f'B{next_row_excel}'] = time_str
-                sheet[f'D{next_row_excel}'] = "Manually Clocked In"
-                status_message, target_row_widget = f"Clocked In: {staff_name}", next_row_excel - 3
-                row_to_update_taps = next_row_excel
-
-            elif action_type == 'out':
-                if target_row_excel == -1:
-                    return f"Error: {staff_name} has not clocked in today.", -1
-                if is_clocked_out:
-                    return f"Error: {staff_name} is already clocked out.", -1
-                sheet[f'C{target_row_excel}'] = time_str
-
-                existing_remark = sheet[f'D{target_row_excel}'].value
-                if existing_remark == "Manually Clocked In":
-                    sheet[f'D{target_row_excel}'] = "Manually Clocked In/Out"
-                else:
-                    sheet[f'D{target_row_excel}'] = "Manually Clocked Out"
+        def on_error(e):
+            if file_path != self.current_excel_file_path:
+                return
+            self._load_future = None
+            QMessageBox.critical(self, "Error Reading File", f"Could not read the Excel file:\\n\\n{e}")
+            if on_done:
+                on_done(None)
+
+        # Keyed by path so the load waits for a save of the same sheet in progress.
+        self._load_future = executor.call(load_sheet_for_display, file_path, on_result=on_loaded, on_error=on_error,
+                                          priority=PRIORITY_HIGH, key=file_path, name="Load sheet")
+
+    def is_loading(self):
+        """True while a sheet load is in progress; its result will replace the rows shown."""
+        return self._load_future is not None
+
+    def _show_sheet(self, file_date_str, headers, rows):
+        self.setColumnCount(len(headers))
+        self.setHorizontalHeaderLabels(headers)
+        self.setRowCount(len(rows))
+        for row_idx, row_data in enumerate(rows):
+            for col_idx, cell_value in enumerate(row_data):
+                self._set_cell(row_idx, col_idx, str(cell_value) if cell_value is not None else "")
+        self._rebuild_row_index()
+
+        if self.columnCount() > 3:
+            self.setColumnHidden(3, True)
+        if self.columnCount() > 4:
+            self.setColumnHidden(4, True)
+
+        self.setColumnWidth(0, 350)
+        return file_date_str
+
+    def _set_cell(self, row, col, text):
+        item = QTableWidgetItem(text)
+        item.setForeground(QColor(c.WIN_COLOR_TEXT_PRIMARY))
+        item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setItem(row, col, item)
+
+    def _cell_text(self, row, col):
+        item = self.item(row, col)
+        return item.text() if item else ""
+
+    def _rebuild_row_index(self):
+        self._row_index = {}
+        self._next_free_row = None
+        for row in range(self.rowCount()):
+            name = self._cell_text(row, 0)
+            if name:
+                self._row_index.setdefault(name, row)
+            elif self._next_free_row is None:
+                self._next_free_row = row
+        if self._next_free_row is None:
+            self._next_free_row = self.rowCount()
+
+    def find_row(self, staff_name):
+        """Returns the table row showing `staff_name`, or -1."""
+        return self._row_index.get(staff_name, -1)
+
+    def _claim_free_row(self, staff_name):
+        """Puts `staff_name` in the first empty row and returns it."""
+        row = self._next_free_row
+        if row >= self.rowCount():
+            # The view only holds populated rows, so a new name gets a new row.
+            self.insertRow(row)
+            for col in range(1, self.columnCount()):
+                self._set_cell(row, col, "")
+        self._set_cell(row, 0, staff_name)
+        self._row_index[staff_name] = row
+
+        next_row = row + 1
+        while next_row < self.rowCount() and self._cell_text(next_row, 0):
+            next_row += 1
+        self._next_free_row = next_row
+        return row
+
+    def update_view_for_swipe(self, staff_name, current_time_str, total_taps, first_tap_time_str=None):
+        """
+        Applies a swipe to the table directly, the same way the next export
+        renders it in the sheet. Returns (status message, row index).
+        """
+        if self.columnCount() < 5:
+            return f"Tap Recorded: {staff_name}", -1
+
+        row = self.find_row(staff_name)
+        if row == -1:
+            row = self._claim_free_row(staff_name)
+            self._set_cell(row, 1, first_tap_time_str or current_time_str)
+            action = "Clocked In"
+        else:
+            action = "Tap Recorded"
+
+        if total_taps % 2 == 0:
+            self._set_cell(row, 2, current_time_str)
+            action = "Clocked Out"
+
+        existing_taps = self._cell_text(row, 4)
+        self._set_cell(row, 4, f"{existing_taps}, {current_time_str}" if existing_taps else current_time_str)
+        return f"{action}: {staff_name}", row
+
+    def refresh_from_database(self, sheet_date, highlight_name=None, on_done=None):
+        """
+        Re-exports the day's sheet from the database, then reloads the view
+        from it (if that day is still shown) and highlights `highlight_name`.
+        """
+        def on_exported(file_path):
+            # A sheet that could not be saved is retried in the background and
+            # shown from the database meanwhile, so the view is reloaded either way.
+            if not (self.current_excel_file_path and sheet_date_from_path(self.current_excel_file_path) == sheet_date):
+                if on_done:
+                    on_done()
+                return
 
-                status_message, target_row_widget = f"Clocked Out: {staff_name}", target_row_excel - 3
-                row_to_update_taps = target_row_excel
+            def on_reloaded(file_date_str):
+                if highlight_name:
+                    self.highlight_row(self.find_row(highlight_name), QColor(c.WIN_COLOR_ACCENT_PRIMARY))
+                if on_done:
+                    on_done()
 
-            if row_to_update_taps != -1:
-                existing_taps = sheet[f'E{row_to_update_taps}'].value
-                new_taps = f"{existing_taps}, {time_str}" if existing_taps else time_str
-                sheet[f'E{row_to_update_taps}'] = new_taps
+            self.display_excel_content(self.current_excel_file_path, on_done=on_reloaded)
 
-            sheet.protection.sheet = True
-            workbook.save(file_path)
-            return status_message, target_row_widget
-        except Exception as e:
-            QMessageBox.critical(self, "Error Saving File", f"An error occurred while saving to Excel:\\n\\n{e}")
-            return f"Save failed: {e}", -1
+        get_db_worker().deliver(schedule_export(sheet_date, immediate=True), on_result=on_exported)
 
     # MODIFICATION: Removed the faulty logic that created new blank items.
     def highlight_row(self, row_index, color):
@@ -243,23 +236,10 @@ class SignInTable(QTableWidget):
                 item.setBackground(default_bg_color)
                 item.setForeground(default_fg_color)
 
-    def get_staff_in_building(self):
-        staff_in = []
-        for row in range(self.rowCount()):
-            name_item = self.item(row, 0)
-            if not name_item or not name_item.text():
-                continue
-
-            cin_item = self.item(row, 1)
-            cout_item = self.item(row, 2)
-
-            if cin_item and cin_item.text() and (not cout_item or not cout_item.text()):
-                staff_in.append(name_item.text())
-        return staff_in
-
     def clear_table(self):
         self.setRowCount(0)
         self.clearContents()
+        self._rebuild_row_index()
 
     def contextMenuEvent(self, event):
         menu = QMenu(self)
@@ -285,25 +265,25 @@ class SignInTable(QTableWidget):
                 return
             staff_name, token = staff['name'], staff['token']
             try:
-                file_name = os.path.basename(self.current_excel_file_path)
-                date_part = os.path.splitext(file_name)[0]
-                sheet_date = datetime.strptime(date_part, '%m-%d-%Y').date()
+                sheet_date = sheet_date_from_path(self.current_excel_file_path)
                 full_datetime = datetime.combine(sheet_date, time.toPython())
-                db_timestamp = full_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                db_event_date = full_datetime.strftime("%Y-%m-%d")
-                log_tap_event(staff_name, token, db_timestamp, db_event_date)
             except Exception as e:
                 QMessageBox.critical(self, "Date Error", f"Could not create timestamp for database log: {e}")
                 return
-            status, row_to_highlight = self.record_manual_entry(self.current_excel_file_path, staff_name, time, action)
-            if "Error:" in status:
-                QMessageBox.warning(self, "Action Blocked", status)
-                return
-            self.display_excel_content(self.current_excel_file_path)
-            if row_to_highlight != -1:
-                highlight_color = QColor(c.WIN_COLOR_ACCENT_PRIMARY)
-                self.highlight_row(row_to_highlight, highlight_color)
-            QMessageBox.information(self, "Success", f"'{staff_name}' has been manually recorded.")
+            get_db_worker().call(
+                record_manual_tap, token, full_datetime, action,
+                on_result=lambda status: self._finish_manual_entry(sheet_date, staff_name, status),
+                on_error=lambda e: QMessageBox.critical(self, "Database Error", f"Could not log the entry: {e}")
+            )
+
+    def _finish_manual_entry(self, sheet_date, staff_name, status):
+        if "Error:" in status:
+            QMessageBox.warning(self, "Action Blocked", status)
+            return
+        self.refresh_from_database(
+            sheet_date, highlight_name=staff_name,
+            on_done=lambda: QMessageBox.information(self, "Success", f"'{staff_name}' has been manually recorded.")
+        )
 
     def _delete_selected_entry(self):
         row_index = self.currentRow()
@@ -316,16 +296,18 @@ class SignInTable(QTableWidget):
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
             try:
-                wb = openpyxl.load_workbook(self.current_excel_file_path)
-                ws = wb.active
-                ws.protection.password = "lsst1234"
-                ws.protection.sheet = False
-                ws.delete_rows(row_index + 3)
-                ws.protection.sheet = True
-                wb.save(self.current_excel_file_path)
-                self.display_excel_content(self.current_excel_file_path)
+                sheet_date = sheet_date_from_path(self.current_excel_file_path)
             except Exception as e:
-                QMessageBox.critical(self, "Error Deleting", f"Could not delete entry from Excel: {e}")
+                QMessageBox.critical(self, "Date Error", f"Could not determine date from file name: {e}")
+                return
+
+            def on_deleted(ok):
+                if ok:
+                    self.refresh_from_database(sheet_date)
+                else:
+                    QMessageBox.critical(self, "Error Deleting", f"Could not delete the entry for '{name}'.")
+
+            get_db_worker().call(delete_day_entry, name, sheet_date, on_result=on_deleted)
 
     def _view_history_selected_entry(self):
         row_index = self.currentRow()
@@ -334,12 +316,11 @@ class SignInTable(QTableWidget):
         if not item or not item.text(): return
         name = item.text()
         try:
-            file_name = os.path.basename(self.current_excel_file_path)
-            date_part = os.path.splitext(file_name)[0]
-            query_date = datetime.strptime(date_part, '%m-%d-%Y').strftime('%Y-%m-%d')
+            query_date = sheet_date_from_path(self.current_excel_file_path)
         except Exception as e:
             QMessageBox.critical(self, "Date Error", f"Could not determine date from file name: {e}")
             return
-        tap_times = get_taps_for_staff_and_date(name, query_date)
-        history_dialog = StaffHistoryDialog(name, tap_times, self)
-        history_dialog.exec()
\ No newline at end of file
+        get_db_worker().call(
+            get_taps_for_staff_and_date, name, query_date,
+            on_result=lambda tap_times: StaffHistoryDialog(name, tap_times, self).exec()
+        )
\ No newline at end of file
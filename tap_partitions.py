@@ -0,0 +1,229 @@
+# tap_partitions.py
+"""
+Per-year partitioning of tap history.
+
+Closed years are moved out of tap_history.db into tap_history_<year>.db files
+that hold their own tap_events and daily_summary tables. The files are
+ATTACHed to a connection only when a query needs that year, so the daily
+swipe path keeps working against a small database while history queries
+fan out across the partitions transparently.
+"""
+import glob
+import os
+import re
+import sqlite3
+from datetime import date
+
+from schema_migrations import ARCHIVE_DATA_MIGRATIONS
+
+# Tables that are partitioned by year; staff always stays in the main database.
+PARTITIONED_TABLES = ('tap_events', 'daily_summary')
+
+# SQLite allows 10 attached databases by default; keep a couple spare.
+MAX_ATTACHED = 8
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _year_bounds(year):
+    """Returns the first and last day numbers of a calendar year."""
+    return (date(year, 1, 1).toordinal() - _EPOCH_ORDINAL,
+            date(year, 12, 31).toordinal() - _EPOCH_ORDINAL)
+
+
+def _year_of(day):
+    return date.fromordinal(day + _EPOCH_ORDINAL).year
+
+
+class PartitionSet:
+    """Tracks the per-year archive files that belong to one main database."""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._years = None
+
+    def archive_path(self, year):
+        base, ext = os.path.splitext(self.db_file)
+        return f"{base}_{year}{ext or '.db'}"
+
+    def years(self):
+        """Returns the set of years that have an archive file on disk."""
+        if self._years is None:
+            base, ext = os.path.splitext(self.db_file)
+            pattern = re.compile(re.escape(os.path.basename(base)) + r'_(\d{4})' + re.escape(ext or '.db') + '$')
+            self._years = set()
+            for path in glob.glob(f"{base}_*{ext or '.db'}"):
+                match = pattern.match(os.path.basename(path))
+                if match:
+                    self._years.add(int(match.group(1)))
+        return self._years
+
+    def _attach(self, conn, year, keep=()):
+        """
+        Attaches the archive for `year` (if not already) and returns its schema
+        name. When MAX_ATTACHED archives are attached already, the oldest one
+        not named in `keep` is detached first.
+        """
+        schema = f"y{year}"
+        attached = [row[1] for row in conn.execute("PRAGMA database_list")]
+        if schema in attached:
+            return schema
+
+        archives = [name for name in attached if re.fullmatch(r'y\d{4}', name)]
+        spare = [name for name in archives if name not in keep]
+        if len(archives) >= MAX_ATTACHED and spare and not conn.in_transaction:
+            try:
+                conn.execute(f"DETACH DATABASE {spare[0]}")
+            except sqlite3.OperationalError:
+                pass  # Still in use by an open cursor; SQLite will refuse the attach if truly full.
+
+        conn.execute("ATTACH DATABASE ? AS " + schema, (self.archive_path(year),))
+        self._sync_schema(conn, schema)
+        return schema
+
+    def _sync_schema(self, conn, schema):
+        """
+        Mirrors the main database's partitioned tables, indexes and triggers
+        into an archive. Foreign keys are dropped because staff lives in main.
+        Columns added by later migrations are added to existing archives, and
+        the data changes in ARCHIVE_DATA_MIGRATIONS are replayed on them.
+        """
+        if conn.execute("PRAGMA query_only").fetchone()[0]:
+            return  # read-only reporting connection; the writer keeps archives in sync
+        main_version = conn.execute("PRAGMA main.user_version").fetchone()[0]
+        archive_version = conn.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+        if archive_version == main_version:
+            return
+
+        placeholders = ', '.join('?' * len(PARTITIONED_TABLES))
+        objects = conn.execute(
+            f"SELECT type, name, tbl_name, sql FROM main.sqlite_master "
+            f"WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL "
+            f"ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END",
+            PARTITIONED_TABLES
+        ).fetchall()
+        existing = {row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master")}
+        if not existing:
+            # A new archive: match main's auto_vacuum before the first table is created.
+            auto_vacuum = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+            conn.execute(f"PRAGMA {schema}.auto_vacuum = {auto_vacuum}")
+
+        for obj_type, name, table, sql in objects:
+            qualified = re.sub(r'^(CREATE (?:UNIQUE )?(?:TABLE|INDEX|TRIGGER) )"?(\w+)"?',
+                               rf'\1{schema}.\2', sql, count=1)
+            if obj_type == 'table':
+                if name not in existing:
+                    conn.execute(re.sub(r'\s+REFERENCES\s+\w+\s*\([^)]*\)', '', qualified))
+                    continue
+                main_cols = conn.execute(f"PRAGMA main.table_info({name})").fetchall()
+                archive_cols = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({name})")}
+                for col in main_cols:
+                    if col[1] not in archive_cols:
+                        default = f" DEFAULT {col[4]}" if col[4] is not None else ""
+                        conn.execute(f"ALTER TABLE {schema}.{name} ADD COLUMN {col[1]} {col[2]}{default}")
+            elif obj_type == 'index':
+                if name not in existing:
+                    conn.execute(qualified)
+            else:
+                conn.execute(f"DROP TRIGGER IF EXISTS {schema}.{name}")
+                conn.execute(qualified)
+
+        if existing:
+            for version, migration in sorted(ARCHIVE_DATA_MIGRATIONS.items()):
+                if archive_version < version <= main_version:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        migration(conn, schema)
+                        conn.commit()
+                    except sqlite3.Error:
+                        conn.rollback()
+                        raise
+        conn.execute(f"PRAGMA {schema}.user_version = {main_version}")
+
+    def sync_archives(self, conn):
+        """
+        Brings every archive on disk up to the main database's schema. Call
+        after migrations on the writer connection: read-only connections never
+        sync, so an archive left at an older version breaks history queries.
+        """
+        for year in sorted(self.years()):
+            self._sync_schema(conn, self._attach(conn, year))
+
+    def schema_for_day(self, conn, day):
+        """Returns the schema ('main' or an attached archive) that holds `day`."""
+        year = _year_of(day)
+        if year not in self.years():
+            return 'main'
+        return self._attach(conn, year)
+
+    def split_range(self, start_day, end_day):
+        """
+        Splits an inclusive day range into (year, first_day, last_day) parts in
+        chronological order, one per archived year, without attaching anything.
+        Consecutive years that live in main are merged into one part whose
+        year is None.
+        """
+        parts = []
+        for year in range(_year_of(start_day), _year_of(end_day) + 1):
+            first, last = _year_bounds(year)
+            first, last = max(first, start_day), min(last, end_day)
+            archived = year if year in self.years() else None
+            if parts and parts[-1][0] is None and archived is None:
+                parts[-1] = (None, parts[-1][1], last)
+            else:
+                parts.append((archived, first, last))
+        return parts
+
+    def schemas_for_range(self, conn, start_day, end_day):
+        """
+        Splits an inclusive day range into (schema, first_day, last_day) parts
+        in chronological order, attaching the archives it needs. A range can
+        need at most MAX_ATTACHED archives at once; longer ranges are read a
+        part at a time (see split_range).
+        """
+        parts = self.split_range(start_day, end_day)
+        keep = {f"y{year}" for year, _, _ in parts if year is not None}
+        return [(self._attach(conn, year, keep) if year is not None else 'main', first, last)
+                for year, first, last in parts]
+
+    def archive_closed_years(self, conn, current_year=None):
+        """
+        Moves every year before `current_year` out of the main database into its
+        own archive file. Rows are copied and committed before they are
+        deleted from main, so an interrupted run is completed by the next one.
+        Returns the list of years archived.
+        """
+        if current_year is None:
+            current_year = date.today().year
+        cutoff = _year_bounds(current_year)[0]
+        row = conn.execute("SELECT MIN(day) FROM main.tap_events WHERE day < ?", (cutoff,)).fetchone()
+        if row[0] is None:
+            return []
+
+        archived = []
+        for year in range(_year_of(row[0]), current_year):
+            first, last = _year_bounds(year)
+            if not conn.execute("SELECT 1 FROM main.tap_events WHERE day BETWEEN ? AND ? LIMIT 1",
+                                (first, last)).fetchone():
+                continue
+            self.years().add(year)
+            schema = self._attach(conn, year)
+            for table in PARTITIONED_TABLES:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(f"INSERT OR REPLACE INTO {schema}.{table} "
+                                 f"SELECT * FROM main.{table} WHERE day BETWEEN ? AND ?", (first, last))
+                    conn.commit()
+                except sqlite3.Error:
+                    conn.rollback()
+                    raise
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table in reversed(PARTITIONED_TABLES):
+                    conn.execute(f"DELETE FROM main.{table} WHERE day BETWEEN ? AND ?", (first, last))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            archived.append(year)
+        return archived
@@ -0,0 +1,94 @@
+# tap_writer.py
+"""
+Group-commit writer for tap events.
+
+Every committed transaction costs an fsync, so logging taps one transaction
+at a time makes a burst of swipes at shift change (or an import) pay that
+cost once per tap. TapWriter collects taps for a few milliseconds, or until
+a batch is full, and writes the whole batch with database_manager's
+log_tap_events in one transaction. Each caller gets a Future that resolves
+once its tap is durable: True if it was logged, False if no active staff
+member holds the token. If the batch could not be written the Future fails
+with the database error instead.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from config_manager import load_group_commit_ms, load_group_commit_max_batch
+from database_manager import log_tap_events
+
+
+class TapWriter(threading.Thread):
+    """A thread that turns queued tap writes into group commits."""
+    _STOP = object()
+
+    def __init__(self, max_delay_ms=None, max_batch=None):
+        super().__init__(name="TapWriter", daemon=True)
+        self.max_delay_ms = load_group_commit_ms() if max_delay_ms is None else max_delay_ms
+        self.max_batch = max(1, load_group_commit_max_batch() if max_batch is None else max_batch)
+        self._queue = queue.Queue()
+
+    def submit(self, token, when=None):
+        """Queues one tap and returns a Future resolving to True/False after its commit."""
+        future = Future()
+        self._queue.put((future, token, when or datetime.now()))
+        return future
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay_ms / 1000
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True  # commit what was collected, then exit
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = log_tap_events([(token, when) for _, token, when in batch])
+        except Exception as e:
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+        for (future, _, _), logged in zip(batch, results):
+            future.set_result(logged)
+
+    def stop(self, timeout=5.0):
+        """Commits every queued tap, then stops the thread."""
+        if self.is_alive():
+            self._queue.put(self._STOP)
+            self.join(timeout)
+
+
+_writer = None
+
+
+def get_tap_writer():
+    """Returns the application-wide TapWriter, starting it on first use."""
+    global _writer
+    if _writer is None:
+        _writer = TapWriter()
+        _writer.start()
+    return _writer
+
+
+def shutdown_tap_writer():
+    """Flushes and stops the application-wide TapWriter, if it was started."""
+    if _writer is not None:
+        _writer.stop()
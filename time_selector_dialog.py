@@ -6,7 +6,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtGui import QFont, QColor
 
 import constants as c
-from database_manager import get_all_staff
+from staff_directory import get_staff_directory
 
 
 class TimeSelectorDialog(QDialog):
@@ -20,7 +20,7 @@ class TimeSelectorDialog(QDialog):
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.Dialog)
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
 
-        self.all_staff = get_all_staff()
+        self.all_staff = get_staff_directory().all()
         self.action = None
 
         # --- Main Background Frame ---
@@ -0,0 +1,165 @@
+# xlsx_patch.py
+"""
+In-place updates of daily sheets at the zip level.
+
+An xlsx file is a zip of XML parts. Re-rendering a day with openpyxl parses
+and rewrites every part (styles, the 200 bordered rows, the protection)
+even when a swipe changed a single cell. patch_sheet_rows instead rewrites
+only the <row> elements whose values changed inside the worksheet part and
+copies every other part of the zip unchanged. Changed cells are written as
+inline strings and keep their existing style, so a shared-strings part (if
+Excel added one) is only read, never rewritten.
+
+Sheets that do not have the expected layout (a missing part or row, a
+prefixed namespace, more rows than the form has) are reported as not
+patched, and the caller falls back to a full openpyxl render.
+"""
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+SHEET_PART = 'xl/worksheets/sheet1.xml'
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+COLUMNS = "ABCDE"
+
+_ROW_RE = re.compile(rb'<row r="(\d+)"[^>]*?(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(rb'<c r="([A-Z]+)\d+"([^>]*?)\s*(?:/>|>(.*?)</c>)', re.S)
+_STYLE_RE = re.compile(rb'\ss="(\d+)"')
+_TYPE_RE = re.compile(rb'\st="(\w+)"')
+_TEXT_RE = re.compile(rb'<t(?:\s[^>]*)?>(.*?)</t>', re.S)
+_VALUE_RE = re.compile(rb'<v>(.*?)</v>', re.S)
+_SHARED_ITEM_RE = re.compile(rb'<si>(.*?)</si>', re.S)
+
+
+class _LayoutError(Exception):
+    """The sheet is not laid out the way this module expects."""
+
+
+def _shared_strings(archive):
+    if SHARED_STRINGS_PART not in archive.namelist():
+        return []
+    data = archive.read(SHARED_STRINGS_PART)
+    return [unescape(b"".join(_TEXT_RE.findall(item)).decode('utf-8'))
+            for item in _SHARED_ITEM_RE.findall(data)]
+
+
+def _parse_row(body, archive, shared):
+    """Returns {column letter: (style attribute, value or None)} for one <row> body."""
+    cells = {}
+    for column, attrs, content in _CELL_RE.findall(body or b""):
+        style = _STYLE_RE.search(attrs)
+        kind = _TYPE_RE.search(attrs)
+        kind = kind.group(1) if kind else b'n'
+        value = None
+        if content:
+            if kind == b'inlineStr':
+                value = unescape(b"".join(_TEXT_RE.findall(content)).decode('utf-8'))
+            else:
+                raw = _VALUE_RE.search(content)
+                if raw is not None:
+                    value = raw.group(1).decode('utf-8')
+                    if kind == b's':
+                        if shared is None:
+                            shared = _shared_strings(archive)
+                        value = shared[int(value)]
+        cells[column.decode()] = (style.group(0) if style else b"", value)
+    return cells, shared
+
+
+def _cell_xml(ref, style, value):
+    if value is None or value == "":
+        return b'<c r="%s"%s/>' % (ref.encode(), style)
+    text = escape(str(value)).encode('utf-8')
+    space = b' xml:space="preserve"' if str(value) != str(value).strip() else b""
+    return b'<c r="%s"%s t="inlineStr"><is><t%s>%s</t></is></c>' % (ref.encode(), style, space, text)
+
+
+def _patched_sheet(sheet_xml, archive, rows, first_row):
+    """Returns the worksheet XML with `rows` written from `first_row` down, or None if nothing changed."""
+    if b'<worksheet' not in sheet_xml[:300]:
+        raise _LayoutError("worksheet root not found")
+
+    spans = {int(match.group(1)): match for match in _ROW_RE.finditer(sheet_xml)}
+    if not spans:
+        raise _LayoutError("no rows found")
+    last_row = max(spans)
+    if first_row + len(rows) - 1 > last_row:
+        raise _LayoutError("more rows than the form holds")
+
+    shared = None
+    replacements = []
+    for row_number in range(first_row, last_row + 1):
+        match = spans.get(row_number)
+        if match is None:
+            raise _LayoutError(f"row {row_number} is missing")
+        cells, shared = _parse_row(match.group(2), archive, shared)
+        if any(column not in cells for column in COLUMNS):
+            raise _LayoutError(f"row {row_number} is missing cells")
+
+        index = row_number - first_row
+        wanted = rows[index] if index < len(rows) else ()
+        wanted = [wanted[i] if i < len(wanted) and wanted[i] not in ("", None) else None
+                  for i in range(len(COLUMNS))]
+        current = [cells[column][1] if cells[column][1] != "" else None for column in COLUMNS]
+        if wanted == current:
+            if index >= len(rows) and all(value is None for value in current):
+                break  # the rest of the form is blank already
+            continue
+
+        # Rebuild the row element with its own attributes and each cell's style.
+        head = match.group(0)[:match.group(0).index(b'>') + 1]
+        if head.endswith(b'/>'):
+            raise _LayoutError(f"row {row_number} is empty")
+        body = b"".join(_cell_xml(f"{column}{row_number}", cells[column][0], wanted[i])
+                        for i, column in enumerate(COLUMNS))
+        replacements.append((match.start(), match.end(), head + body + b'</row>'))
+
+    if not replacements:
+        return None
+    parts = []
+    position = 0
+    for start, end, text in replacements:
+        parts.append(sheet_xml[position:start])
+        parts.append(text)
+        position = end
+    parts.append(sheet_xml[position:])
+    return b"".join(parts)
+
+
+def sheet_rows_match(file_path, rows, first_row=3):
+    """True if the data rows of a sheet already equal `rows`; False if they differ or cannot be read."""
+    try:
+        with zipfile.ZipFile(file_path) as src:
+            return _patched_sheet(src.read(SHEET_PART), src, rows, first_row) is None
+    except (_LayoutError, OSError, KeyError, zipfile.BadZipFile, ValueError, IndexError):
+        return False
+
+
+def patch_sheet_rows(file_path, rows, first_row=3):
+    """
+    Makes the data rows of a sheet equal `rows` (sequences of cell values for
+    columns A-E, starting at `first_row`), rewriting only the rows that
+    differ. Rows below the data are cleared. Returns True if the file is up
+    to date afterwards, False if it must be rendered in full instead.
+    """
+    temp_path = file_path + ".tmp"
+    try:
+        with zipfile.ZipFile(file_path) as src:
+            if SHEET_PART not in src.namelist():
+                return False
+            patched = _patched_sheet(src.read(SHEET_PART), src, rows, first_row)
+            if patched is None:
+                return True
+            with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as dst:
+                for info in src.infolist():
+                    dst.writestr(info, patched if info.filename == SHEET_PART else src.read(info))
+        os.replace(temp_path, file_path)
+        return True
+    except _LayoutError as e:
+        print(f"Sheet '{file_path}' cannot be patched ({e}); rewriting it in full.")
+    except (OSError, zipfile.BadZipFile, ValueError, IndexError) as e:
+        print(f"Error patching '{file_path}': {e}")
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    return False